@@ -1,4 +1,5 @@
 import pandas
+import itertools
 
 from argparse import BooleanOptionalAction
 from dataclasses import dataclass
@@ -7,6 +8,8 @@ from typing import ClassVar, Type
 from core.tensorflow.preprocessor.prediction import Prediction
 from core.utils.container import DeclarativeContainer
 from core.utils.config import Config
+from core.utils.serializer import RepresentationSerializer
+from core.trading.interval import Interval
 from core.utils.command import CommandSession
 from core.utils.time import now, normalize_timestamp
 from core.utils.collection.command import ListOutputFormatCommandSessionMixin
@@ -27,6 +30,8 @@ class PredictCommandSession(
 		self.parser.add_argument('--evaluate', action = BooleanOptionalAction)
 		self.parser.add_argument('--prompt', '-p', action = BooleanOptionalAction)
 		self.parser.add_argument('--timestamp', type = normalize_timestamp, default = now())
+		self.parser.add_argument('--to', dest = 'to_timestamp', type = normalize_timestamp, help = 'Predict every `--every` from `--timestamp` up to this timestamp in batches')
+		self.parser.add_argument('--every', type = RepresentationSerializer(Interval).deserialize, default = Interval.Minute(15))
 
 	def run(self):
 		super().run()
@@ -45,6 +50,8 @@ class PredictCommandSession(
 				timestamp = input('Timestamp: ')
 				timestamp = normalize_timestamp(timestamp)
 				self.predict(timestamp)
+		elif self.args.to_timestamp:
+			self.predict_many(pandas.date_range(self.args.timestamp, self.args.to_timestamp, freq = self.args.every.to_pandas_timedelta()))
 		else:
 			self.predict(self.args.timestamp)
 
@@ -53,4 +60,11 @@ class PredictCommandSession(
 			model = self.model,
 			timestamp = timestamp,
 		)
-		self.print_list(predictions, self.prediction_class)
\ No newline at end of file
+		self.print_list(predictions, self.prediction_class)
+
+	def predict_many(self, timestamps: pandas.DatetimeIndex):
+		predictions = (getattr(self.predictor_service, 'evaluate_many' if self.args.evaluate else 'predict_many'))(
+			model = self.model,
+			timestamps = timestamps,
+		)
+		self.print_list(list(itertools.chain(*predictions.values())), self.prediction_class)
\ No newline at end of file
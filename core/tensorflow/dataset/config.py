@@ -1,3 +1,4 @@
+from pathlib import Path
 from dataclasses import field
 from core.utils.config import Config, dataclass, on_stage
 
@@ -12,4 +13,17 @@ class DatasetConfig(Config):
 	validation_split: float = 0.3
 	max_queue_size: int = 10
 	workers: int = 5
-	use_multiprocessing: bool = True
\ No newline at end of file
+	use_multiprocessing: bool = True
+	# Read the whole history once and build samples out of it in memory
+	materialize: bool = False
+	# Serve the preprocessed samples written by the materialize command from here when present
+	store_directory: Path = None
+	# Keep the indices of the valid samples here so the dataset is only scanned for them once
+	validity_path: Path = None
+	# Input pipeline to build the datasets with, either 'sequence' (keras sequences) or 'tf.data'
+	backend: str = 'sequence'
+	# Seeds the training/validation split and the shuffling of the training samples
+	seed: int = None
+	# Cache the samples read by the 'tf.data' pipeline to files in here
+	cache_directory: Path = None
+	shuffle_buffer_size: int = 10000
\ No newline at end of file
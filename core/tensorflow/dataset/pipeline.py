@@ -0,0 +1,61 @@
+import numpy
+import tensorflow
+from pathlib import Path
+from keras.utils.data_utils import Sequence
+
+from core.tensorflow.dataset.sequence.batched import get_batch
+
+AUTOTUNE = tensorflow.data.AUTOTUNE
+
+def to_signature(data):
+	return tensorflow.nest.map_structure(
+		lambda array: tensorflow.TensorSpec(shape = numpy.shape(array), dtype = tensorflow.as_dtype(numpy.asarray(array).dtype)),
+		data
+	)
+
+def map_with_numpy(dataset: tensorflow.data.Dataset, function, signature) -> tensorflow.data.Dataset:
+	"""Maps the indices in `dataset` to the structured arrays `function` returns for them, in parallel and in order"""
+	specs = tensorflow.nest.flatten(signature)
+
+	def load(indices):
+		return [
+			numpy.asarray(array, dtype = spec.dtype.as_numpy_dtype)
+			for array, spec in zip(tensorflow.nest.flatten(function(indices)), specs)
+		]
+
+	def map_function(indices):
+		tensors = tensorflow.numpy_function(load, [ indices ], [ spec.dtype for spec in specs ], stateful = False)
+		for tensor, spec in zip(tensors, specs):
+			tensor.set_shape(spec.shape)
+		return tensorflow.nest.pack_sequence_as(signature, tensors)
+
+	return dataset.map(map_function, num_parallel_calls = AUTOTUNE, deterministic = True)
+
+def build_pipeline(
+	sequence: Sequence,
+	batch_size: int,
+	shuffle: bool = False,
+	seed: int = None,
+	cache_path: Path = None,
+	shuffle_buffer_size: int = 10000,
+) -> tensorflow.data.Dataset:
+	"""`tf.data` pipeline over the `(x, y)` samples of `sequence` that repeats indefinitely.
+	Without a `cache_path` the indices get shuffled and batched first so every batch is read with one `get_batch` call.
+	With one, samples are read one by one and cached to the file on the first pass so later epochs shuffle from the cache."""
+	dataset = tensorflow.data.Dataset.range(len(sequence))
+
+	if cache_path:
+		Path(cache_path).parent.mkdir(parents = True, exist_ok = True)
+		dataset = map_with_numpy(dataset, lambda index: sequence[int(index)], to_signature(sequence[0]))
+		dataset = dataset.cache(str(cache_path))
+		if shuffle:
+			dataset = dataset.shuffle(shuffle_buffer_size, seed = seed, reshuffle_each_iteration = True)
+		dataset = dataset.batch(batch_size, drop_remainder = True)
+	else:
+		if shuffle:
+			dataset = dataset.shuffle(len(sequence), seed = seed, reshuffle_each_iteration = True)
+		dataset = dataset.batch(batch_size, drop_remainder = True)
+		signature = to_signature(get_batch(sequence, numpy.arange(batch_size)))
+		dataset = map_with_numpy(dataset, lambda indices: get_batch(sequence, indices), signature)
+
+	return dataset.repeat().prefetch(AUTOTUNE)
@@ -3,4 +3,5 @@ from .partial import PartialSequence
 from .shuffled import ShuffledSequence
 from .kwargs import sequence_dataclass_kwargs
 from .shared_memory import SharedMemorySequence
-from .skippable import SkippableSequence
\ No newline at end of file
+from .skippable import SkippableSequence
+from .stored import StoredSequence
\ No newline at end of file
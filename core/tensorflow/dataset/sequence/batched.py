@@ -3,6 +3,35 @@ from dataclasses import dataclass
 from keras.utils.data_utils import Sequence
 from .kwargs import sequence_dataclass_kwargs
 
+def get_batch(sequence: Sequence, indices: numpy.ndarray):
+	"""Stacked `(x, y)` of the samples at `indices`. Sequences that implement `get_batch(indices)` answer the whole batch at once."""
+	if hasattr(sequence, 'get_batch'):
+		return sequence.get_batch(indices)
+	return stack([ sequence[index] for index in indices ])
+
+def stack(items: list):
+	"""Copies every `(x, y)` sample straight into batch arrays allocated from the first one"""
+	x, y = items[0]
+	inputs = allocate(x, len(items))
+	outputs = allocate(y, len(items))
+	for position, (x, y) in enumerate(items):
+		fill(inputs, x, position)
+		fill(outputs, y, position)
+	return inputs, outputs
+
+def allocate(data, size: int):
+	if type(data) == dict:
+		return { key : allocate(value, size) for key, value in data.items() }
+	data = numpy.asarray(data)
+	return numpy.empty((size, *data.shape), dtype = data.dtype)
+
+def fill(buffer, data, position: int):
+	if type(buffer) == dict:
+		for key in buffer:
+			buffer[key][position] = data[key]
+		return
+	buffer[position] = data
+
 @dataclass(**sequence_dataclass_kwargs)
 class BatchedSequence(Sequence):
 	sequence: Sequence = None
@@ -13,27 +42,7 @@ class BatchedSequence(Sequence):
 
 	def __getitem__(self, index):
 		start = index * self.batch_size
-		end = start + self.batch_size
-		inputs, outputs = [], []
-		for batch_item_index in range(start, end):
-			x, y = self.sequence[batch_item_index]
-			inputs.append(x)
-			outputs.append(y)
-
-		inputs = self.normalize(inputs)
-		outputs = self.normalize(outputs)
-
-		return inputs, outputs
-
-	def normalize(self, data):
-		if type(data[0]) == dict:
-			return {
-				key : numpy.stack([
-					item[key]
-					for item in data
-				])
-				for key in data[0]
-			}
-		if type(data) == list:
-			return numpy.array(data)
-		return data
+		return get_batch(self.sequence, numpy.arange(start, start + self.batch_size))
+
+	def on_epoch_end(self):
+		self.sequence.on_epoch_end()
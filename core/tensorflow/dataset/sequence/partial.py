@@ -1,9 +1,11 @@
 import functools
 import math
+import numpy
 
 from dataclasses import dataclass
 from keras.utils.data_utils import Sequence
 from .kwargs import sequence_dataclass_kwargs
+from .batched import get_batch
 
 @dataclass(**sequence_dataclass_kwargs)
 class PartialSequence(Sequence):
@@ -20,3 +22,8 @@ class PartialSequence(Sequence):
 	def __getitem__(self, index):
 		return self.sequence[self.index_offset + index]
 
+	def get_batch(self, indices: numpy.ndarray):
+		return get_batch(self.sequence, numpy.asarray(indices) + self.index_offset)
+
+	def on_epoch_end(self):
+		self.sequence.on_epoch_end()
\ No newline at end of file
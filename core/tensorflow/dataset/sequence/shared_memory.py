@@ -1,186 +1,245 @@
 import numpy
+from collections import deque
 
 from dataclasses import dataclass, field
 from keras.utils.data_utils import Sequence
 from multiprocess import Process, Queue
 from multiprocess.shared_memory import SharedMemory
-from multiprocess.managers import SharedMemoryManager
 
 from .kwargs import sequence_dataclass_kwargs
 
-class GarbageCollectedSharedMemory(SharedMemory):
-	def __del__(self):
-		super().__del__()
-		self.unlink()
-
-class SharedMemoryNumpyArray(numpy.ndarray):
-	def __new__(cls, *args, shared_memory = None, **kwargs):
-		obj = super(SharedMemoryNumpyArray, cls).__new__(cls, *args, **kwargs)
-		obj.shared_memory = shared_memory
-		return obj
-
-	def __array_finalize__(self, obj):
-		if obj is None: return
-		self.shared_memory = getattr(obj, 'shared_memory', None)
+# Keeps every array of a slot aligned for vectorized reads
+SLOT_ALIGNMENT = 64
+
+def to_layout(data, offset: int = 0) -> tuple[dict, int]:
+	"""Describes where every array of a batch lives inside a slot. Returns the layout and the offset after it."""
+	if isinstance(data, numpy.ndarray):
+		layout = {
+			'_type' : 'numpy',
+			'_offset' : offset,
+			'_shape' : data.shape,
+			'_dtype' : data.dtype.str,
+		}
+		return layout, offset + -(-data.nbytes // SLOT_ALIGNMENT) * SLOT_ALIGNMENT
+
+	if type(data) in [ list, tuple ]:
+		items = []
+		for item in data:
+			item_layout, offset = to_layout(item, offset)
+			items.append(item_layout)
+		return { '_type' : type(data).__name__, '_items' : items }, offset
+
+	if type(data) == dict:
+		layout = { '_type' : 'dict', '_items' : {} }
+		for key, value in data.items():
+			layout['_items'][key], offset = to_layout(value, offset)
+		return layout, offset
+
+	raise Exception(f'Unrecognized type to share between processes {type(data)}')
+
+def write_to_slot(data, layout: dict, buffer: memoryview):
+	if layout['_type'] == 'numpy':
+		array = numpy.ndarray(layout['_shape'], dtype = layout['_dtype'], buffer = buffer, offset = layout['_offset'])
+		if numpy.shape(data) != array.shape:
+			raise Exception(f"Every batch has to have the shape of the first one to share it through a slot. Expected {array.shape} but got {numpy.shape(data)}.")
+		array[...] = data
+		return
+
+	if layout['_type'] == 'dict':
+		for key, item_layout in layout['_items'].items():
+			write_to_slot(data[key], item_layout, buffer)
+		return
+
+	for item, item_layout in zip(data, layout['_items']):
+		write_to_slot(item, item_layout, buffer)
+
+def read_from_slot(layout: dict, buffer: memoryview):
+	if layout['_type'] == 'numpy':
+		return numpy.ndarray(layout['_shape'], dtype = layout['_dtype'], buffer = buffer, offset = layout['_offset'])
+
+	if layout['_type'] == 'dict':
+		return {
+			key : read_from_slot(item_layout, buffer)
+			for key, item_layout in layout['_items'].items()
+		}
+
+	items = [ read_from_slot(item_layout, buffer) for item_layout in layout['_items'] ]
+	return tuple(items) if layout['_type'] == 'tuple' else items
+
+def copy_batch(data):
+	if isinstance(data, numpy.ndarray):
+		return data.copy()
+	if type(data) == dict:
+		return { key : copy_batch(value) for key, value in data.items() }
+	return type(data)(copy_batch(item) for item in data)
 
 @dataclass(**sequence_dataclass_kwargs)
 class SharedMemorySequence(Sequence):
+	"""Prefetches batches in a persistent pool of worker processes and hands them over through a ring of preallocated shared memory slots.
+	Batches are served by the requested index, the next `max_queue_size` indices get computed ahead and `on_epoch_end` is replayed
+	on the workers' copies of the sequence so they follow the same reshuffles without being respawned.
+	Batches are copied out of their slot by default since keras prefetches them through tf.data, which can wrap numpy buffers
+	without copying and keeps an unbounded number of them around. With `copy = False` a batch is a view of its slot instead
+	and only stays valid for the next `hold` batches, for consumers that are done with a batch by then."""
 	sequence: Sequence = None
 	workers: int = 3
 	max_queue_size: int = 8
+	copy: bool = True
+	hold: int = 1
 
-	manager: SharedMemoryManager = field(init = False, default = None)
 	processes: list[Process] = field(init = False, default = None)
-	queue: Queue = field(init = False, default = None)
+	tasks: Queue = field(init = False, default = None)
+	results: Queue = field(init = False, default = None)
+	slots: list[SharedMemory] = field(init = False, default = None)
+	layout: dict = field(init = False, default = None)
+
+	def __post_init__(self):
+		self.epoch = 0
+		self.requested: dict[int, int] = {} # index -> slot, `None` while being computed
+		self.free_slots: deque[int] = deque()
+		self.held_slots: deque[int] = deque()
 
 	def __len__(self):
 		return len(self.sequence)
 
 	def __getitem__(self, index):
-		def convert_from_address_book(address_book) -> dict[str, dict or list or SharedMemoryNumpyArray]:
-			if address_book['_type'] == 'numpy':
-				shared_memory = GarbageCollectedSharedMemory(
-					name = address_book['_name'],
-				)
-				shared_array = SharedMemoryNumpyArray(
-					shape = address_book['_shape'],
-					dtype = address_book['_dtype'],
-					buffer = shared_memory.buf,
-					offset = 0,
-					shared_memory = shared_memory
-				)
-				return shared_array
-
-			if address_book['_type'] == 'list':
-				return [
-					convert_from_address_book(item)
-					for item in address_book['_items']
-				]
-			
-			if address_book['_type'] == 'tuple':
-				return tuple(
-					convert_from_address_book(item)
-					for item in address_book['_items']
-				)
-
-			if address_book['_type'] == 'dict':
-				return {
-					key : convert_from_address_book(value)
-					for key, value in address_book.items()
-					if key != '_type' # Skip the type indicator
-				}
-
-			raise Exception(f'Could not parse address book {address_book}')
-
-		self.ensure_workers_initialized()
-		item = self.queue.get(block = True)
-		item = convert_from_address_book(item)
+		if self.processes == None:
+			self.start(index)
+
+		# The consumer is done with the oldest batch it holds so its slot can be reused
+		while len(self.held_slots) >= self.hold:
+			self.free_slots.append(self.held_slots.popleft())
+
+		if index not in self.requested:
+			while len(self.free_slots) == 0:
+				self.evict()
+			self.request(index)
+		for next_index in range(index + 1, min(index + 1 + self.max_queue_size, len(self))):
+			if len(self.free_slots) == 0:
+				break
+			if next_index not in self.requested:
+				self.request(next_index)
+
+		while self.requested[index] == None:
+			self.collect()
+		slot = self.requested.pop(index)
+		item = read_from_slot(self.layout, self.slots[slot].buf)
+		if self.copy:
+			item = copy_batch(item)
+			self.free_slots.append(slot)
+		else:
+			self.held_slots.append(slot)
 		return item['x'], item['y']
 
+	def on_epoch_end(self):
+		self.epoch += 1
+		self.sequence.on_epoch_end()
+
+		# Whatever got prefetched for the last epoch is stale. Batches still being computed get freed as they come in.
+		for slot in self.requested.values():
+			if slot != None:
+				self.free_slots.append(slot)
+		self.requested = {}
+
 	def __del__(self):
 		self.ensure_workers_destroyed()
 
+	def request(self, index: int):
+		slot = self.free_slots.popleft()
+		self.requested[index] = None
+		self.tasks.put((self.epoch, index, slot))
+
+	def collect(self):
+		epoch, index, slot = self.results.get(block = True)
+		if epoch != self.epoch or index not in self.requested:
+			self.free_slots.append(slot)
+			return
+		self.requested[index] = slot
+
+	def evict(self):
+		"""Frees the slot of the furthest prefetched batch, waiting for one if none is ready"""
+		ready = [ index for index, slot in self.requested.items() if slot != None ]
+		if len(ready) == 0:
+			self.collect()
+			return
+		self.free_slots.append(self.requested.pop(max(ready)))
+
 	@staticmethod
 	def worker(
-		manager: SharedMemoryManager = None,
 		sequence: Sequence = None,
-		queue: Queue = None,
-		indices: list[int] = None,
+		slots: list[SharedMemory] = None,
+		layout: dict = None,
+		tasks: Queue = None,
+		results: Queue = None,
+		epoch: int = 0,
 	):
-		def convert_numpy_array_to_shared_memory(data: numpy.ndarray):
-			shared_memory = manager.SharedMemory(
-				size = data.nbytes
-			)
-			shared_array = numpy.ndarray(
-				shape = data.shape,
-				dtype = data.dtype,
-				buffer = shared_memory.buf,
-				offset = 0
-			)
-			shared_array[:] = data[:]
-			return shared_array, shared_memory
-
-		def convert_to_memory_address_book(data: list or numpy.ndarray or dict[str, dict or numpy.ndarray]):
-			if type(data) == numpy.ndarray:
-				shared_array, shared_memory = convert_numpy_array_to_shared_memory(data)
-				return {
-					'_type' : 'numpy',
-					'_name' : shared_memory.name,
-					'_shape': shared_array.shape,
-					'_dtype': shared_array.dtype,
-				}
-
-			if type(data) == list:
-				return {
-					'_type': 'list',
-					'_items': [
-						convert_to_memory_address_book(item)
-						for item in data
-					]
-				}
-
-			if type(data) == tuple:
-				return {
-					'_type': 'tuple',
-					'_items': [
-						convert_to_memory_address_book(item)
-						for item in data
-					]
-				}
-
-			if type(data) == dict:
-				address = {
-					key : convert_to_memory_address_book(value)
-					for key, value in data.items()
-				}
-				address['_type'] = 'dict'
-				return address
-
-			raise Exception(f'Unrecognized type to share between processes {type(data)}')
-
-		for index in indices:
-			x, y = sequence[index]
-			item = {
-				'x' : x,
-				'y' : y,
-			}
-			item = convert_to_memory_address_book(item)
-			queue.put(item)
-
-	def ensure_workers_initialized(self):
-		if self.manager != None:
-			return
+		# `sequence` comes with the reshuffles up to `epoch` already applied
+		while True:
+			task = tasks.get(block = True)
+			if task == None:
+				return
+
+			task_epoch, index, slot = task
+			while epoch < task_epoch:
+				sequence.on_epoch_end()
+				epoch += 1
 
-		self.manager = SharedMemoryManager()
-		self.manager.start()
-		self.queue = Queue(maxsize = self.max_queue_size)
+			x, y = sequence[index]
+			write_to_slot({ 'x' : x, 'y' : y }, layout, slots[slot].buf)
+			results.put((task_epoch, index, slot))
+
+	def start(self, index: int):
+		# The first requested batch sizes the slots
+		x, y = self.sequence[index]
+		item = { 'x' : x, 'y' : y }
+		self.layout, size = to_layout(item)
+		self.slots = [
+			SharedMemory(create = True, size = max(size, 1))
+			for _ in range(self.max_queue_size + self.hold + 2)
+		]
+		write_to_slot(item, self.layout, self.slots[0].buf)
+		self.requested[index] = 0
+		self.free_slots.extend(range(1, len(self.slots)))
 
-		indices_batches = numpy.array_split(numpy.arange(len(self)), self.workers)
+		self.tasks = Queue()
+		self.results = Queue()
 		self.processes = [
 			Process(
 				target = self.worker,
 				kwargs = {
 					'sequence': self.sequence,
-					'manager': self.manager,
-					'queue': self.queue,
-					'indices': indices_batch
+					'slots': self.slots,
+					'layout': self.layout,
+					'tasks': self.tasks,
+					'results': self.results,
+					'epoch': self.epoch,
 				},
+				daemon = True,
 			)
-			for indices_batch in indices_batches
+			for _ in range(self.workers)
 		]
 		for process in self.processes:
 			process.start()
 
 	def ensure_workers_destroyed(self):
 		if self.processes:
+			for _ in self.processes:
+				self.tasks.put(None)
 			for process in self.processes:
-				process.close()
-				process.join()
+				process.join(timeout = 5)
+				if process.is_alive():
+					process.terminate()
 			self.processes = None
-		if self.manager:
-			self.manager.shutdown()
-			self.manager.join()
-			self.manager = None
-		if self.queue:
-			self.queue.close()
-			self.queue = None
+		for queue in [ self.tasks, self.results ]:
+			if queue:
+				queue.close()
+		self.tasks = None
+		self.results = None
+		if self.slots:
+			for slot in self.slots:
+				try:
+					slot.close()
+				except BufferError: # Batches handed out are still around
+					pass
+				slot.unlink()
+			self.slots = None
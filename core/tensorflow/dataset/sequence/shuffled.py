@@ -2,11 +2,14 @@ import numpy
 from dataclasses import dataclass, field
 from keras.utils.data_utils import Sequence
 from .kwargs import sequence_dataclass_kwargs
+from .batched import get_batch
 
 @dataclass(**sequence_dataclass_kwargs)
 class ShuffledSequence(Sequence):
 	sequence: Sequence
 	indices: list[int] = field(init=False)
+	seed: int = None
+	reshuffle: bool = False # reshuffle at the end of every epoch
 
 	def __len__(self):
 		return len(self.indices)
@@ -14,9 +17,22 @@ class ShuffledSequence(Sequence):
 	def __getitem__(self, index):
 		return self.sequence[self.indices[index]]
 
+	def get_batch(self, indices: numpy.ndarray):
+		return get_batch(self.sequence, self.indices[numpy.asarray(indices)])
+
 	def __post_init__(self):
+		# Every copy of the sequence (i.e. in worker processes) has to come up with the same order for the same epoch
+		if self.seed == None:
+			self.seed = numpy.random.randint(2 ** 31)
+		self.epoch = 0
 		self.shuffle()
 
+	def on_epoch_end(self):
+		self.sequence.on_epoch_end()
+		if self.reshuffle:
+			self.epoch += 1
+			self.shuffle()
+
 	def shuffle(self):
 		self.indices = numpy.arange(len(self.sequence))
-		numpy.random.shuffle(self.indices)
+		numpy.random.default_rng(self.seed + self.epoch).shuffle(self.indices)
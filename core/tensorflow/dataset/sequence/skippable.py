@@ -1,19 +1,77 @@
+import numpy
+from pathlib import Path
 from dataclasses import dataclass
 from keras.utils.data_utils import Sequence
+from multiprocess import Pool
 
+from core.utils.logging import Logger
 from .kwargs import sequence_dataclass_kwargs
+from .batched import get_batch
+
+logger = Logger(__name__)
+
+# Sequence being scanned by a worker process of the pool
+worker_sequence: Sequence = None
+
+def attach_sequence(sequence: Sequence):
+	"""Pool initializer so the sequence gets sent to every worker once instead of with every chunk"""
+	global worker_sequence
+	worker_sequence = sequence
+
+def find_valid_indices(indices: numpy.ndarray, sequence: Sequence = None) -> numpy.ndarray:
+	sequence = worker_sequence if sequence == None else sequence
+	return numpy.array([ index for index in indices if type(sequence[index]) != type(None) ], dtype = 'int64')
 
 @dataclass(**sequence_dataclass_kwargs)
 class SkippableSequence(Sequence):
+	"""Serves only the samples of `sequence` that are not `None`. Which ones those are is found once by scanning the whole
+	sequence over `workers` processes and kept at `path` when given so later runs don't have to scan it again.
+	The kept indices are only reused for the same `fingerprint` of whatever the samples are built from."""
 	sequence: Sequence = None
-	offset: int = 0
+	path: Path = None
+	workers: int = 1
+	fingerprint: str = None
+
+	def __post_init__(self):
+		self.indices = self.load_indices()
 
 	def __getitem__(self, index):
-		item = self.sequence[index + self.offset]
-		if type(item) == type(None):
-			self.offset += 1
-			return self[index]
-		return item
+		return self.sequence[self.indices[index]]
+
+	def get_batch(self, indices: numpy.ndarray):
+		return get_batch(self.sequence, self.indices[numpy.asarray(indices)])
 
 	def __len__(self):
-		return len(self.sequence)
\ No newline at end of file
+		return len(self.indices)
+
+	def on_epoch_end(self):
+		self.sequence.on_epoch_end()
+
+	def load_indices(self) -> numpy.ndarray:
+		path = Path(self.path) if self.path else None
+		if path and path.exists():
+			stored = numpy.load(path)
+			fingerprint = str(stored['fingerprint']) if 'fingerprint' in stored else ''
+			if stored['length'] == len(self.sequence) and fingerprint == (self.fingerprint or ''):
+				return stored['indices']
+			logger.info(f'Sequence changed since {path} was written. Scanning it again...')
+
+		indices = self.scan()
+		if path:
+			path.parent.mkdir(parents = True, exist_ok = True)
+			with path.open('wb') as file:
+				numpy.savez(file, indices = indices, length = len(self.sequence), fingerprint = self.fingerprint or '')
+		return indices
+
+	def scan(self) -> numpy.ndarray:
+		logger.info(f'Scanning {len(self.sequence)} samples for valid ones...')
+		chunks = numpy.array_split(numpy.arange(len(self.sequence)), max(self.workers, 1) * 16)
+		if self.workers <= 1:
+			valid_indices = [ find_valid_indices(chunk, self.sequence) for chunk in chunks ]
+		else:
+			with Pool(self.workers, initializer = attach_sequence, initargs = (self.sequence,)) as pool:
+				valid_indices = pool.map(find_valid_indices, chunks)
+
+		indices = numpy.concatenate(valid_indices)
+		logger.info(f'Found {len(indices)} valid samples out of {len(self.sequence)}.')
+		return indices
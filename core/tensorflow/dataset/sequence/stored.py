@@ -0,0 +1,18 @@
+from dataclasses import dataclass
+from keras.utils.data_utils import Sequence
+
+from core.tensorflow.dataset.store import TensorStore
+from .kwargs import sequence_dataclass_kwargs
+
+@dataclass(**sequence_dataclass_kwargs)
+class StoredSequence(Sequence):
+	store: TensorStore = None
+
+	def __len__(self):
+		return len(self.store)
+
+	def __getitem__(self, index):
+		return self.store[index]
+
+	def get_batch(self, indices):
+		return self.store.get_batch(indices)
@@ -0,0 +1,156 @@
+import json
+import numpy
+import shutil
+import typing
+from pathlib import Path
+from dataclasses import dataclass
+
+if typing.TYPE_CHECKING:
+	from keras.utils.data_utils import Sequence
+
+from core.utils.logging import Logger
+
+logger = Logger(__name__)
+
+@dataclass
+class TensorStore:
+	"""Preprocessed `(x, y)` samples of a sequence written once into `.npy` shards and served back memory-mapped.
+	Every element of a sample is either an array or a dict of arrays and gets one shard file per key.
+	A store only counts as existing for the `fingerprint` of whatever its samples were built from."""
+	directory: Path = None
+	shard_size: int = 4096
+	fingerprint: str = None
+
+	def __post_init__(self):
+		self.directory = Path(self.directory)
+		self.shards: dict[int, list] = {}
+		self.index: dict = None
+
+	@property
+	def exists(self) -> bool:
+		if not self.directory.joinpath('index.json').exists():
+			return False
+		fingerprint = self.load_index().get('fingerprint')
+		if fingerprint != self.fingerprint:
+			logger.warn(f'Ignoring the samples stored at {self.directory} as they were built from something else ({fingerprint} instead of {self.fingerprint}).')
+			return False
+		return True
+
+	def load_index(self) -> dict:
+		if self.index == None:
+			self.index = json.loads(self.directory.joinpath('index.json').read_text())
+			self.offsets = numpy.cumsum([ 0 ] + self.index['shards'])
+		return self.index
+
+	def __len__(self):
+		return int(sum(self.load_index()['shards']))
+
+	def __getitem__(self, index: int):
+		self.load_index()
+		if index < 0:
+			index += len(self)
+		shard = numpy.searchsorted(self.offsets, index, side = 'right') - 1
+		arrays = self.get_shard(shard)
+		return self.unflatten([ array[index - self.offsets[shard]] for array in arrays ])
+
+	def get_batch(self, indices: numpy.ndarray):
+		"""Gathers the samples at `indices` shard by shard with one fancy-index per key into preallocated batch arrays"""
+		self.load_index()
+		indices = numpy.asarray(indices)
+		indices = numpy.where(indices < 0, indices + len(self), indices)
+		shards = numpy.searchsorted(self.offsets, indices, side = 'right') - 1
+
+		batch = None
+		if len(indices) == 0:
+			batch = [ numpy.empty((0, *array.shape[1:]), dtype = array.dtype) for array in self.get_shard(0) ]
+		for shard in numpy.unique(shards):
+			positions = numpy.flatnonzero(shards == shard)
+			arrays = self.get_shard(shard)
+			if batch == None:
+				batch = [ numpy.empty((len(indices), *array.shape[1:]), dtype = array.dtype) for array in arrays ]
+			for buffer, array in zip(batch, arrays):
+				buffer[positions] = array[indices[positions] - self.offsets[shard]]
+		return self.unflatten(batch)
+
+	@property
+	def source_indices(self) -> numpy.ndarray:
+		"""Index of every stored sample in the sequence it was written from"""
+		return numpy.load(self.directory.joinpath('indices.npy'), mmap_mode = 'r')
+
+	def get_shard(self, shard: int) -> list[numpy.ndarray]:
+		if shard not in self.shards:
+			self.shards[shard] = [
+				numpy.load(self.get_shard_path(shard, key), mmap_mode = 'r')
+				for key in range(self.get_key_count())
+			]
+		return self.shards[shard]
+
+	def get_shard_path(self, shard: int, key: int, directory: Path = None) -> Path:
+		return (directory or self.directory).joinpath(f'{shard:05d}.{key}.npy')
+
+	def get_key_count(self) -> int:
+		return sum(1 if keys == None else len(keys) for keys in self.load_index()['structure'])
+
+	def write(self, sequence: 'Sequence', indices: list[int] = None):
+		"""Preprocesses every sample of `sequence` once and stores it. Samples that come back as `None` are skipped.
+		The samples are written next to the store and swapped in once they're all there so a failed write leaves the previous store as it was."""
+		directory = self.directory.with_name(f'{self.directory.name}.tmp')
+		shutil.rmtree(directory, ignore_errors = True)
+		directory.mkdir(parents = True)
+		self.shards = {}
+		self.index = { 'structure' : None, 'shards' : [], 'fingerprint' : self.fingerprint }
+		indices = range(len(sequence)) if indices == None else indices
+
+		buffer = []
+		source_indices = []
+		for index in indices:
+			item = sequence[index]
+			if type(item) == type(None):
+				continue
+
+			if self.index['structure'] == None:
+				self.index['structure'] = [ list(element.keys()) if type(element) == dict else None for element in item ]
+			buffer.append(self.flatten(item))
+			source_indices.append(index)
+
+			if len(buffer) == self.shard_size:
+				self.write_shard(buffer, directory)
+				buffer = []
+		if len(buffer):
+			self.write_shard(buffer, directory)
+
+		numpy.save(directory.joinpath('indices.npy'), numpy.array(source_indices, dtype = 'int64'))
+		directory.joinpath('index.json').write_text(json.dumps(self.index))
+
+		# Shards of a previous write don't linger around in the new store
+		previous_directory = self.directory.with_name(f'{self.directory.name}.old')
+		shutil.rmtree(previous_directory, ignore_errors = True)
+		if self.directory.exists():
+			self.directory.rename(previous_directory)
+		directory.rename(self.directory)
+		shutil.rmtree(previous_directory, ignore_errors = True)
+		logger.info(f'Stored {len(source_indices)} samples in {len(self.index["shards"])} shards at {self.directory}.')
+		self.index = None
+
+	def write_shard(self, buffer: list[list[numpy.ndarray]], directory: Path = None):
+		shard = len(self.index['shards'])
+		for key in range(len(buffer[0])):
+			numpy.save(self.get_shard_path(shard, key, directory), numpy.stack([ arrays[key] for arrays in buffer ]))
+		self.index['shards'].append(len(buffer))
+		logger.debug(f'Wrote shard {shard} with {len(buffer)} samples.')
+
+	def flatten(self, item) -> list[numpy.ndarray]:
+		arrays = []
+		for element in item:
+			if type(element) == dict:
+				arrays.extend(numpy.asarray(value) for value in element.values())
+			else:
+				arrays.append(numpy.asarray(element))
+		return arrays
+
+	def unflatten(self, arrays: list[numpy.ndarray]):
+		arrays = iter(arrays)
+		return tuple(
+			next(arrays) if keys == None else { key: next(arrays) for key in keys }
+			for keys in self.load_index()['structure']
+		)
@@ -1,3 +1,4 @@
+import pandas
 from dataclasses import dataclass
 from keras import Model
 
@@ -13,4 +14,11 @@ class PredictorService:
 	preprocessor_service: PreprocessorService = None
 
 	def predict(self, model: Model, *args, **kwargs) -> Prediction or list[Prediction]:
-		pass
\ No newline at end of file
+		pass
+
+	def predict_many(self, model: Model, timestamps: pandas.DatetimeIndex, *args, **kwargs) -> dict[pandas.Timestamp, Prediction or list[Prediction]]:
+		"""Predictions as of every timestamp. Override to batch them into fewer model calls."""
+		return {
+			timestamp: self.predict(model, timestamp, *args, **kwargs)
+			for timestamp in timestamps
+		}
\ No newline at end of file
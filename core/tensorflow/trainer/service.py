@@ -47,6 +47,7 @@ class TrainerService(ArtifactService):
 			batch_size = self.dataset_service.config.batch_size,
 			validation_batch_size = self.dataset_service.config.batch_size,
 			validation_steps = int(self.config.steps_per_epoch / (1 - self.dataset_service.config.validation_split) * self.dataset_service.config.validation_split),
+			shuffle = False, # datasets reshuffle every epoch themselves and sequences prefetch the batches that follow
 			verbose = True
 		)
 
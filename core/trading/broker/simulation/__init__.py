@@ -1,11 +1,16 @@
 import typing
+import numpy
 import pandas
 import random
+import itertools
 from dataclasses import dataclass, field
 
 from core.trading.broker.broker import Broker
-from .report import BacktestReport
+from .report import BacktestReport, WalkForwardReport
 from .scheduler import Scheduler
+from .prices import PricePaths
+from .book import Book
+from .walk_forward import WalkForward, WalkForwardFold
 
 if typing.TYPE_CHECKING:
 	from core.trading.strategy import Strategy
@@ -17,8 +22,7 @@ from core.trading.size import Size
 from .serializers import DataClassMongoDocumentSerializer
 
 from core.trading.interval import Interval
-from core.utils.time import normalize_timestamp, TimestampLike
-from core.utils.collection import ensure_list
+from core.utils.time import normalize_timestamp, TimestampLike, TimeWindow
 from core.utils.mongo import MongoRepository
 from core.utils.logging import Logger
 
@@ -31,17 +35,25 @@ class SimulationBroker(Broker, MongoRepository):
 	initial_cash: float = 1000.
 	currency: str = 'USD'
 	latency: Interval = Interval.Millisecond(2)
-	positions: list[Position] = field(default_factory = list, repr = False)
-	orders: list[Order] = field(default_factory = list, repr = False)
+	positions: Book[Position] = field(default_factory = Book, repr = False)
+	orders: Book[Order] = field(default_factory = Book, repr = False)
 
 	scheduler: Scheduler = field(default_factory = Scheduler)
 	repository: SimulationRepository = field(default_factory = SimulationRepository)
 
 	equity_curve: pandas.Series = field(default = None, repr = None)
+	price_paths: PricePaths = field(default = None, repr = False)
 
 	def __post_init__(self):
 		self._now = None
 		self._timesteps: pandas.DatetimeIndex = None
+		self.equity_values: numpy.ndarray = None
+		self.timestep_index: int = None
+		if not isinstance(self.orders, Book):
+			self.orders = Book(self.orders)
+		if not isinstance(self.positions, Book):
+			self.positions = Book(self.positions)
+		self.realized_profit = sum(position.profit for position in self.positions if position.status == 'closed')
 
 	@property
 	def timesteps(self):
@@ -55,7 +67,9 @@ class SimulationBroker(Broker, MongoRepository):
 		else:
 			self._timesteps = value
 		if type(self._timesteps) == pandas.DatetimeIndex:
-			self.equity_curve = pandas.Series(index=self._timesteps, dtype='float', name='equity')
+			# Equity gets recorded by timestep index into the array backing the series
+			self.equity_values = numpy.full(len(self._timesteps), numpy.nan)
+			self.equity_curve = pandas.Series(self.equity_values, index = self._timesteps, name = 'equity', copy = False)
 
 	@property
 	def now(self) -> pandas.Timestamp:
@@ -68,47 +82,274 @@ class SimulationBroker(Broker, MongoRepository):
 		if isinstance(self.repository, SimulationRepository):
 			self.repository.now = self._now
 
-	def backtest(self, strategy: 'Strategy'):
-		for self.now in self.timesteps:
-			self.scheduler.run_as_of(self.now)
-
-			for order in self.get_orders(status ='open'):
-				price = self.repository.get_last_price(order.symbol)
-				if (order.type == 'buy' and order.stop and price >= order.stop) \
-					or (order.type == 'sell' and order.stop and price <= order.stop):
-					order.stop = None
-				if order.stop == None \
-					and (order.is_market_order \
-						or (order.type == 'buy' and order.limit and order.limit <= price)\
-						or (order.type == 'sell' and order.limit and order.limit >= price)
-					):
-					self.fill_order(order)
-
-			for position in self.get_positions(status='open'):
-				price = self.repository.get_last_price(position.symbol)
-				if (
-					position.type == 'buy' and (
-						(position.sl and price <= position.sl) or 
-						(position.tp and price >= position.tp)
-					)
-					) or (
-					position.type == 'sell' and (
-						(position.sl and price >= position.sl) or 
-						(position.tp and price <= position.tp)
-					)
-				):
-					self.close_position(position)
-			strategy.handler()
-			self.equity_curve[self.now] = self.equity
+	def backtest(
+		self,
+		strategy: 'Strategy',
+		preload: bool = False,
+		symbols: list[Symbol] = None,
+		event_driven: bool = False,
+		price_paths: PricePaths = None,
+		write_report: bool = True,
+	) -> BacktestReport:
+		"""Runs the strategy over `self.timesteps`
+
+		Args:
+			strategy (Strategy): strategy to backtest
+			preload (bool, optional): load the price paths of the traded symbols into memory once and resolve orders, positions and equity from them instead of querying the repository on every timestep. Triggers are checked against the high/low reached since the previous timestep. Defaults to False.
+			symbols (list[Symbol], optional): symbols to preload upfront. Any other traded symbol gets loaded the first time it's seen. Defaults to None.
+			event_driven (bool, optional): only stop on the timesteps where a scheduled action is due, the strategy's decision is due or an order/position level is crossed and fill the equity curve in between from the preloaded prices. Implies `preload`. Defaults to False.
+			price_paths (PricePaths, optional): already loaded price paths aligned to `self.timesteps` to resolve from instead of preloading them. Defaults to None.
+			write_report (bool, optional): whether to write the backtest report into the database. Defaults to True.
+		"""
+		self.price_paths = price_paths
+		if self.price_paths == None and (preload or event_driven):
+			self.price_paths = PricePaths(
+				repository = self.repository,
+				timesteps = self.timesteps,
+			)
+		if self.price_paths:
+			self.price_paths.load(symbols)
+
+		if event_driven:
+			self.run_events(strategy)
+		else:
+			self.run_timesteps(strategy)
+		self.timestep_index = None
+		self.equity_curve = pandas.Series(self.equity_values, index = self.timesteps, name = 'equity', copy = False)
 
 		report = BacktestReport.from_strategy(
 			strategy = strategy,
 			broker = self
 		)
-		self.write_backtest_report(report)
+		if write_report:
+			self.write_backtest_report(report)
+		return report
+
+	def walk_forward(
+		self,
+		build_strategy: typing.Callable[['SimulationBroker', WalkForwardFold], 'Strategy'],
+		train: Interval,
+		test: Interval,
+		step: Interval = None,
+		time_window: TimeWindow = None,
+		symbols: list[Symbol] = None,
+		event_driven: bool = False,
+		workers: int = 1,
+		write_report: bool = True,
+	) -> WalkForwardReport:
+		"""Splits `time_window` into rolling train/test folds and backtests every test fold on a fresh broker, loading the price paths of `self.timesteps` only once
+
+		Args:
+			build_strategy (Callable): builds the strategy of a fold given its broker and the fold. This is where the strategy gets retrained on `fold.train`.
+			train (Interval): length of the train window of every fold
+			test (Interval): length of the test window of every fold
+			step (Interval, optional): how far the folds roll forward. Defaults to `test`.
+			time_window (TimeWindow, optional): window to split. Defaults to the span of `self.timesteps`.
+			symbols (list[Symbol], optional): symbols to preload and share with parallel folds. Any other symbol gets loaded by every fold that trades it. Defaults to None.
+			event_driven (bool, optional): backtest the folds event driven. Defaults to False.
+			workers (int, optional): number of processes to backtest the folds in. The price paths are shared with them read-only. Defaults to 1.
+			write_report (bool, optional): whether to write the summary into the database. Defaults to True.
+		"""
+		time_window = time_window or TimeWindow(self.timesteps[0], self.timesteps[-1])
+		folds = WalkForwardFold.split(time_window, train = train, test = test, step = step)
+		if len(folds) == 0:
+			raise Exception(f'No fold of {train} train and {test} test fits between {time_window.from_timestamp} and {time_window.to_timestamp}.')
+
+		report = WalkForward(
+			broker = self,
+			build_strategy = build_strategy,
+			folds = folds,
+			symbols = symbols,
+			event_driven = event_driven,
+			workers = workers,
+		).run()
+
+		if write_report:
+			self.write_backtest_report(report)
+		return report
+
+	def run_timesteps(self, strategy: 'Strategy'):
+		for self.timestep_index, self.now in enumerate(self.timesteps):
+			if self.scheduler.is_due(self.now):
+				self.scheduler.run_as_of(self.now)
+
+			if self.price_paths:
+				self.resolve_orders_from_price_paths()
+				self.resolve_positions_from_price_paths()
+			else:
+				self.resolve_orders()
+				self.resolve_positions()
+
+			strategy.handler()
+			self.equity_values[self.timestep_index] = self.equity
+
+	def run_events(self, strategy: 'Strategy'):
+		is_decision_due = strategy.get_decision_mask(self.timesteps)
+		decision_indices = numpy.flatnonzero(is_decision_due)
+
+		index = 0
+		while index < len(self.timesteps):
+			self.timestep_index = index
+			self.now = self.timesteps[index]
+			if self.scheduler.is_due(self.now):
+				self.scheduler.run_as_of(self.now)
+
+			self.resolve_orders_from_price_paths()
+			self.resolve_positions_from_price_paths()
+
+			if is_decision_due[index]:
+				strategy.handler()
+			self.equity_values[index] = self.equity
+
+			next_index = self.get_next_event_index(index + 1, decision_indices)
+			# Nothing happens in between so only the open positions move with the market
+			self.equity_values[index + 1:next_index] = self.balance + self.get_unrealized_profit_path(index + 1, next_index)
+			index = next_index
+
+	def get_next_event_index(self, start: int, decision_indices: numpy.ndarray) -> int:
+		stop = len(self.timesteps)
+
+		position = numpy.searchsorted(decision_indices, start)
+		if position < len(decision_indices):
+			stop = min(stop, decision_indices[position])
+
+		if self.scheduler.next_due_timestamp != None:
+			stop = min(stop, max(start, self.timesteps.searchsorted(self.scheduler.next_due_timestamp)))
+
+		symbols, above, below = self.get_trigger_levels()
+		if len(symbols) == 0:
+			return stop
+		return self.price_paths.find_next_crossing(symbols, above, below, start = start, stop = stop)
+
+	def get_trigger_levels(self) -> tuple[list[Symbol], numpy.ndarray, numpy.ndarray]:
+		"""Levels of the open orders and positions split by whether a rising high or a falling low triggers them"""
+		orders = self.get_orders(status = 'open')
+		positions = self.get_positions(status = 'open')
+
+		is_buy = numpy.array([ order.type == 'buy' for order in orders ], dtype = bool)
+		stop = self.to_price_levels(orders, 'stop')
+		order_levels = numpy.where(numpy.isnan(stop), self.to_price_levels(orders, 'limit'), stop)
+		# Orders without any levels fill on the next timestep no matter the price
+		order_levels = numpy.where(numpy.isnan(order_levels), numpy.where(is_buy, -numpy.inf, numpy.inf), order_levels)
+		order_above = numpy.where(is_buy, order_levels, numpy.nan)
+		order_below = numpy.where(is_buy, numpy.nan, order_levels)
+
+		is_buy = numpy.array([ position.type == 'buy' for position in positions ], dtype = bool)
+		sl = self.to_price_levels(positions, 'sl')
+		tp = self.to_price_levels(positions, 'tp')
+		position_above = numpy.where(is_buy, tp, sl)
+		position_below = numpy.where(is_buy, sl, tp)
+
+		return (
+			[ item.symbol for item in itertools.chain(orders, positions) ],
+			numpy.concatenate([ order_above, position_above ]),
+			numpy.concatenate([ order_below, position_below ]),
+		)
+
+	def resolve_orders(self):
+		for order in self.get_orders(status ='open'):
+			price = self.repository.get_last_price(order.symbol)
+			if (order.type == 'buy' and order.stop and price >= order.stop) \
+				or (order.type == 'sell' and order.stop and price <= order.stop):
+				order.stop = None
+			if order.stop == None \
+				and (order.is_market_order \
+					or (order.type == 'buy' and order.limit and order.limit <= price)\
+					or (order.type == 'sell' and order.limit and order.limit >= price)
+				):
+				self.fill_order(order)
+
+	def resolve_positions(self):
+		for position in self.get_positions(status='open'):
+			price = self.repository.get_last_price(position.symbol)
+			if (
+				position.type == 'buy' and (
+					(position.sl and price <= position.sl) or 
+					(position.tp and price >= position.tp)
+				)
+				) or (
+				position.type == 'sell' and (
+					(position.sl and price >= position.sl) or 
+					(position.tp and price <= position.tp)
+				)
+			):
+				self.close_position(position)
+
+	def resolve_orders_from_price_paths(self):
+		orders = self.get_orders(status = 'open')
+		if len(orders) == 0:
+			return
+
+		high, low = self.get_price_range([ order.symbol for order in orders ])
+		is_buy = numpy.array([ order.type == 'buy' for order in orders ])
+		stop = self.to_price_levels(orders, 'stop')
+		limit = self.to_price_levels(orders, 'limit')
+
+		is_stop_triggered = numpy.where(is_buy, high >= stop, low <= stop)
+		for order in itertools.compress(orders, is_stop_triggered):
+			order.stop = None
+
+		is_stop_pending = ~numpy.isnan(stop) & ~is_stop_triggered
+		is_limit_triggered = numpy.isnan(limit) | numpy.where(is_buy, high >= limit, low <= limit)
+		for order in itertools.compress(orders, ~is_stop_pending & is_limit_triggered):
+			self.fill_order(order)
+
+	def resolve_positions_from_price_paths(self):
+		positions = self.get_positions(status = 'open')
+		if len(positions) == 0:
+			return
+
+		high, low = self.get_price_range([ position.symbol for position in positions ])
+		is_buy = numpy.array([ position.type == 'buy' for position in positions ])
+		sl = self.to_price_levels(positions, 'sl')
+		tp = self.to_price_levels(positions, 'tp')
+
+		is_sl_triggered = numpy.where(is_buy, low <= sl, high >= sl)
+		is_tp_triggered = numpy.where(is_buy, high >= tp, low <= tp)
+		for position in itertools.compress(positions, is_sl_triggered | is_tp_triggered):
+			self.close_position(position)
+
+	def get_price_range(self, symbols: list[Symbol]) -> tuple[numpy.ndarray, numpy.ndarray]:
+		return (
+			self.price_paths.get_prices(symbols, self.timestep_index, 'high'),
+			self.price_paths.get_prices(symbols, self.timestep_index, 'low'),
+		)
 
-	def write_backtest_report(self, report: BacktestReport):
-		collection = self.backtest_reports.get_collection(type(report.strategy).__name__)
+	@staticmethod
+	def to_price_levels(items: list[Order or Position], name: str) -> numpy.ndarray:
+		# Unset levels become NaN so that they never compare as triggered
+		return numpy.fromiter(
+			(getattr(item, name) or numpy.nan for item in items),
+			dtype = 'float64',
+			count = len(items)
+		)
+
+	def get_last_price(self, symbol: Symbol, intent: OrderType = None) -> float:
+		return self.get_last_prices([ symbol ], intent = intent)[0]
+
+	def get_last_prices(self, symbols: list[Symbol], intent: OrderType = None) -> numpy.ndarray:
+		if self.price_paths and self.timestep_index != None:
+			prices = self.price_paths.get_prices(symbols, self.timestep_index)
+		else:
+			prices = numpy.full(len(symbols), numpy.nan)
+
+		# Anything that's not preloaded is queried once per symbol
+		is_missing = numpy.isnan(prices)
+		if is_missing.any():
+			missing_symbols = list(itertools.compress(symbols, is_missing))
+			last_prices = {
+				symbol: self.repository.get_last_price(symbol, intent = intent)
+				for symbol in dict.fromkeys(missing_symbols)
+			}
+			prices[is_missing] = [ last_prices[symbol] for symbol in missing_symbols ]
+		return prices
+
+	def write_backtest_report(self, report: BacktestReport or WalkForwardReport):
+		if isinstance(report, WalkForwardReport):
+			name = f'{type(report.folds[0].backtest.strategy).__name__}WalkForward'
+		else:
+			name = type(report.strategy).__name__
+		collection = self.backtest_reports.get_collection(name)
 		serialized_report = self.dataclass_serializer.to_mongo_document(report)
 		collection.insert_one(serialized_report)
 
@@ -120,18 +361,8 @@ class SimulationBroker(Broker, MongoRepository):
 		to_timestamp: TimestampLike = None,
 		status: OrderStatus = None, 
 	) -> list[Order]:
-		status = ensure_list(status)
-		from_timestamp = normalize_timestamp(from_timestamp)
-		to_timestamp = normalize_timestamp(to_timestamp or self.now)
-		return [
-			order
-			for order in self.orders
-			if ((not symbol) or order.symbol == symbol) \
-				and ((not from_timestamp) or order.open_timestamp >= from_timestamp) \
-				and ((not to_timestamp) or order.open_timestamp <= to_timestamp)
-				and ((not status) or order.status in status)
-				and ((not type) or order.type == type)
-		]
+		orders = self.orders.find(symbol = symbol, type = type, status = status)
+		return self.filter_by_open_timestamp(orders, from_timestamp, to_timestamp)
 
 	def get_positions(
 		self,
@@ -141,17 +372,22 @@ class SimulationBroker(Broker, MongoRepository):
 		to_timestamp: TimestampLike = None,
 		status: PositionStatus = None,
 	) -> list[Position]:
-		status = ensure_list(status)
+		positions = self.positions.find(symbol = symbol, type = type, status = status)
+		return self.filter_by_open_timestamp(positions, from_timestamp, to_timestamp)
+
+	def filter_by_open_timestamp(
+		self,
+		items: list[Order or Position],
+		from_timestamp: TimestampLike = None,
+		to_timestamp: TimestampLike = None,
+	) -> list[Order or Position]:
 		from_timestamp = normalize_timestamp(from_timestamp)
-		to_timestamp = normalize_timestamp(to_timestamp or self.now)
+		to_timestamp = normalize_timestamp(to_timestamp) if to_timestamp else self.now
 		return [
-			position
-			for position in self.positions
-			if ((not symbol) or position.symbol == symbol) \
-				and ((not from_timestamp) or position.open_timestamp >= from_timestamp) \
-				and ((not to_timestamp) or position.open_timestamp <= to_timestamp)
-				and ((not status) or position.status in status)
-				and ((not type) or position.type == type)
+			item
+			for item in items
+			if ((not from_timestamp) or item.open_timestamp >= from_timestamp) \
+				and item.open_timestamp <= to_timestamp
 		]
 
 	def place_order(self, order: Order, schedule = True, **kwargs) -> Order:
@@ -166,7 +402,7 @@ class SimulationBroker(Broker, MongoRepository):
 		order.id = random.randint(0, 1000000000)
 		order.status = 'open'
 		order.open_timestamp = order.broker.now
-		self.orders.append(order)
+		self.orders.add(order)
 		return order
 
 	def cancel_order(self, order: Order, schedule = True):
@@ -178,7 +414,7 @@ class SimulationBroker(Broker, MongoRepository):
 			logger.warning(f'Cannot cancel an order that has been filled: {order}')
 			return
 
-		order.status = 'cancelled'
+		self.orders.set_status(order, 'cancelled')
 		order.close_timestamp = self.now
 
 	def fill_order(self, order: Order):
@@ -192,16 +428,16 @@ class SimulationBroker(Broker, MongoRepository):
 			symbol = order.symbol,
 			type = order.type,
 			size = order.size,
-			entry_price = self.repository.get_last_price(order.symbol),
+			entry_price = self.get_last_price(order.symbol),
 			open_timestamp = self.now,
 			tp = order.tp,
 			sl = order.sl,
 			status = 'open',
 			order = order,
 		)
-		order.status = 'filled'
+		self.orders.set_status(order, 'filled')
 		order.close_timestamp = self.now
-		self.positions.append(order.position)
+		self.positions.add(order.position)
 		return order.position
 
 	def get_units_in_one_lot(self, symbol: 'Symbol'):
@@ -216,9 +452,10 @@ class SimulationBroker(Broker, MongoRepository):
 			logger.warning(f'Cannot close a position that is already closed: {position}')
 			return
 
-		position.status = 'closed'
+		self.positions.set_status(position, 'closed')
 		position.close_timestamp = self.now
-		position.exit_price = self.repository.get_last_price(position.symbol)
+		position.exit_price = self.get_last_price(position.symbol)
+		self.realized_profit += position.profit
 
 	def schedule_action(
 		self,
@@ -235,11 +472,33 @@ class SimulationBroker(Broker, MongoRepository):
 
 	@property
 	def balance(self) -> float:
-		return self.initial_cash + sum(position.profit for position in self.get_positions(status='closed'))
+		return self.initial_cash + self.realized_profit
 
 	@property
 	def equity(self) -> float:
-		return self.initial_cash + sum(position.profit for position in self.get_positions())
+		return self.balance + self.get_unrealized_profit()
+
+	def get_unrealized_profit(self) -> float:
+		"""Marks the open positions to market in one go. Closed positions are already accounted for in `realized_profit`."""
+		positions = self.get_positions(status = 'open')
+		if len(positions) == 0:
+			return 0.
+
+		prices = self.get_last_prices([ position.symbol for position in positions ])
+		units = numpy.fromiter((position.size.to_units for position in positions), dtype = 'float64', count = len(positions))
+		entry_prices = self.to_price_levels(positions, 'entry_price')
+		return float(numpy.nansum(units * (prices - entry_prices)))
+
+	def get_unrealized_profit_path(self, start: int, stop: int) -> numpy.ndarray:
+		"""Unrealized profit of the currently open positions over the preloaded timesteps in `[start, stop)`"""
+		positions = self.get_positions(status = 'open')
+		if len(positions) == 0 or start >= stop:
+			return numpy.zeros(max(stop - start, 0))
+
+		prices = self.price_paths.close[self.price_paths.get_rows([ position.symbol for position in positions ]), start:stop]
+		units = numpy.fromiter((position.size.to_units for position in positions), dtype = 'float64', count = len(positions))
+		entry_prices = self.to_price_levels(positions, 'entry_price')
+		return numpy.nansum(units[:, None] * (prices - entry_prices[:, None]), axis = 0)
 
 	@property
 	def backtest_reports(self):
@@ -0,0 +1,73 @@
+import itertools
+from collections import defaultdict
+from typing import Generic, Iterable, TypeVar
+
+from core.utils.collection import ensure_list
+
+T = TypeVar('T')
+
+class Book(Generic[T]):
+	"""Insertion ordered collection of orders or positions with secondary indexes by status, symbol and type.
+	Status changes must go through `set_status` to keep the indexes up to date."""
+	indexed_fields = [ 'status', 'symbol', 'type' ]
+
+	def __init__(self, items: Iterable[T] = []):
+		self.items: list[T] = []
+		self.sequence: dict[int, int] = {}
+		self.indexes: dict[str, dict[str, dict[int, T]]] = {
+			name: defaultdict(dict)
+			for name in self.indexed_fields
+		}
+		for item in items:
+			self.add(item)
+
+	def __len__(self):
+		return len(self.items)
+
+	def __iter__(self):
+		return iter(self.items)
+
+	def __getitem__(self, index):
+		return self.items[index]
+
+	def __repr__(self):
+		return repr(self.items)
+
+	def add(self, item: T):
+		self.sequence[id(item)] = len(self.items)
+		self.items.append(item)
+		for name, index in self.indexes.items():
+			index[getattr(item, name)][id(item)] = item
+
+	def set_status(self, item: T, status: str):
+		index = self.indexes['status']
+		index[item.status].pop(id(item), None)
+		item.status = status
+		index[status][id(item)] = item
+
+	def find(self, **filters) -> list[T]:
+		filters = {
+			name: ensure_list(values)
+			for name, values in filters.items()
+			if values
+		}
+		if len(filters) == 0:
+			return list(self.items)
+
+		# Walk the most selective index and only check the remaining filters on its matches
+		buckets = {
+			name: [ self.indexes[name].get(value, {}) for value in values ]
+			for name, values in filters.items()
+		}
+		selected_name = min(buckets, key = lambda name: sum(len(bucket) for bucket in buckets[name]))
+		candidates = itertools.chain.from_iterable(bucket.values() for bucket in buckets[selected_name])
+		del filters[selected_name]
+
+		matches = [
+			item
+			for item in candidates
+			if all(getattr(item, name) in values for name, values in filters.items())
+		]
+		# Status buckets are ordered by when items moved into them
+		matches.sort(key = lambda item: self.sequence[id(item)])
+		return matches
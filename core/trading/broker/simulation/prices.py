@@ -0,0 +1,168 @@
+import numpy
+import pandas
+from dataclasses import dataclass, field
+from multiprocess.shared_memory import SharedMemory
+
+from core.trading.chart import Symbol
+from core.trading.interval import Interval
+from core.trading.repository import SimulationRepository
+from core.trading.repository.simulation.prices import PricePath
+from core.utils.collection import ensure_list
+from core.utils.logging import Logger
+
+logger = Logger(__name__)
+
+@dataclass
+class SharedPricePaths:
+	"""Picklable handle to price paths copied into shared memory"""
+	name: str = None
+	shape: tuple[int, int, int] = None
+	rows: dict[Symbol, int] = None
+	timesteps: pandas.DatetimeIndex = None
+	interval: Interval = None
+
+@dataclass
+class PricePaths:
+	"""Price paths of the traded symbols loaded once for the whole backtest and aligned to its timesteps.
+	Every field is stored as a `(symbols, timesteps)` block so a tick can be resolved with a single gather."""
+	repository: SimulationRepository = None
+	timesteps: pandas.DatetimeIndex = None
+	interval: Interval = Interval.Minute(1)
+
+	def __post_init__(self):
+		self.rows: dict[Symbol, int] = {}
+		for name in PricePath.fields:
+			setattr(self, name, numpy.empty((0, len(self.timesteps))))
+
+	def __contains__(self, symbol: Symbol):
+		return symbol in self.rows
+
+	def __getitem__(self, symbol: Symbol) -> PricePath:
+		row = self.get_rows([ symbol ])[0]
+		return PricePath(
+			symbol = symbol,
+			timestamps = self.timesteps.asi8,
+			**{
+				name: getattr(self, name)[row]
+				for name in PricePath.fields
+			}
+		)
+
+	def load(self, symbols: list[Symbol] or Symbol):
+		symbols = [ symbol for symbol in dict.fromkeys(ensure_list(symbols) or []) if symbol not in self.rows ]
+		if len(symbols) == 0:
+			return
+
+		paths = []
+		for symbol in symbols:
+			logger.debug(f'Preloading price path of {symbol} from {self.timesteps[0]} to {self.timesteps[-1]}...')
+			path = self.repository.read_price_path(
+				symbol = symbol,
+				from_timestamp = self.timesteps[0],
+				to_timestamp = self.timesteps[-1],
+				interval = self.interval,
+			)
+			paths.append(path.align(self.timesteps))
+
+		for name in PricePath.fields:
+			block = numpy.vstack([ getattr(self, name) ] + [ getattr(path, name) for path in paths ])
+			setattr(self, name, block)
+		for symbol in symbols:
+			self.rows[symbol] = len(self.rows)
+
+	def get_rows(self, symbols: list[Symbol]) -> numpy.ndarray:
+		self.load([ symbol for symbol in symbols if symbol not in self.rows ])
+		return numpy.fromiter((self.rows[symbol] for symbol in symbols), dtype = 'int64', count = len(symbols))
+
+	def get_prices(
+		self,
+		symbols: list[Symbol],
+		index: int,
+		name: str = 'close',
+	) -> numpy.ndarray:
+		rows = self.get_rows(symbols) # might load symbols and replace the blocks
+		return getattr(self, name)[rows, index]
+
+	def slice(self, start: int, stop: int) -> 'PricePaths':
+		"""Zero-copy view of the timesteps in `[start, stop)` sharing the symbols loaded so far"""
+		price_paths = type(self)(
+			repository = self.repository,
+			timesteps = self.timesteps[start:stop],
+			interval = self.interval,
+		)
+		price_paths.rows = dict(self.rows)
+		for name in PricePath.fields:
+			setattr(price_paths, name, getattr(self, name)[:, start:stop])
+		return price_paths
+
+	def find_next_crossing(
+		self,
+		symbols: list[Symbol],
+		above: numpy.ndarray,
+		below: numpy.ndarray,
+		start: int,
+		stop: int = None,
+		chunk_size: int = 64,
+	) -> int:
+		"""Index of the first timestep in `[start, stop)` where the high of any symbol reaches its `above` level or its low reaches its `below` level.
+		Scans in doubling chunks so an event close to `start` doesn't pay for the rest of the backtest. Returns `stop` if nothing crosses."""
+		stop = len(self.timesteps) if stop == None else stop
+		rows = self.get_rows(symbols)
+		above = numpy.asarray(above, dtype = 'float64')[:, None]
+		below = numpy.asarray(below, dtype = 'float64')[:, None]
+
+		while start < stop:
+			end = min(start + chunk_size, stop)
+			is_crossed = (self.high[rows, start:end] >= above) | (self.low[rows, start:end] <= below)
+			indices = numpy.flatnonzero(is_crossed.any(axis = 0))
+			if len(indices):
+				return start + int(indices[0])
+			start = end
+			chunk_size *= 2
+		return stop
+
+	def to_shared_memory(self) -> tuple[SharedMemory, SharedPricePaths]:
+		"""Copies the blocks into one shared memory segment. The caller owns the segment and has to `close` and `unlink` it when done."""
+		shape = (len(PricePath.fields), len(self.rows), len(self.timesteps))
+		memory = SharedMemory(create = True, size = max(int(numpy.prod(shape)) * 8, 1))
+		blocks = numpy.ndarray(shape, dtype = 'float64', buffer = memory.buf)
+		for index, name in enumerate(PricePath.fields):
+			blocks[index] = getattr(self, name)
+		return memory, SharedPricePaths(
+			name = memory.name,
+			shape = shape,
+			rows = dict(self.rows),
+			timesteps = self.timesteps,
+			interval = self.interval,
+		)
+
+	@classmethod
+	def from_shared_memory(
+		cls,
+		shared: SharedPricePaths,
+		repository: SimulationRepository = None,
+	) -> tuple[SharedMemory, 'PricePaths']:
+		"""Maps price paths shared by another process without copying them. The blocks are read-only and the segment has to stay open for as long as they're used."""
+		memory = SharedMemory(name = shared.name)
+		blocks = numpy.ndarray(shared.shape, dtype = 'float64', buffer = memory.buf)
+		blocks.flags.writeable = False
+
+		price_paths = cls(
+			repository = repository,
+			timesteps = shared.timesteps,
+			interval = shared.interval,
+		)
+		price_paths.rows = dict(shared.rows)
+		for index, name in enumerate(PricePath.fields):
+			setattr(price_paths, name, blocks[index])
+		return memory, price_paths
+
+# Price paths mapped into the current worker process by `attach_price_paths`
+worker_memory: SharedMemory = None
+worker_price_paths: PricePaths = None
+
+def attach_price_paths(shared: SharedPricePaths, repository: SimulationRepository = None):
+	"""Pool initializer that maps the shared price paths once per worker process.
+	`repository` loads the price paths of symbols that weren't shared and backs the workers' brokers."""
+	global worker_memory, worker_price_paths
+	worker_memory, worker_price_paths = PricePaths.from_shared_memory(shared, repository = repository)
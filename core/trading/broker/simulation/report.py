@@ -44,7 +44,8 @@ class EquityReport:
 		report.low = equity_curve.min()
 		report.close = equity_curve[-1]
 		report.curve = equity_curve
-		report.max_drawdown_percentage = max(1 - equity_curve / numpy.maximum.accumulate(equity_curve))
+		values = equity_curve.to_numpy()
+		report.max_drawdown_percentage = float(numpy.max(1 - values / numpy.maximum.accumulate(values)))
 		report.return_percentage = report.open / report.close * 100 - 100
 		return report
 
@@ -56,8 +57,12 @@ class NumericStats:
 
 	@classmethod
 	def from_collection(cls, collection: list, key: str = None):
-		items = [ getattr(item, key) for item in collection if getattr(item, key) != None ] if key else collection
+		"""Stats of the values that are not `None`, all `None` if there are none"""
+		items = [ getattr(item, key) for item in collection ] if key else collection
+		items = [ item for item in items if item != None ]
 		stats = cls()
+		if len(items) == 0:
+			return stats
 		stats.min = min(items)
 		stats.max = max(items)
 		stats.average = functools.reduce(operator.add, items) / len(items)
@@ -88,7 +93,8 @@ class PositionsReport:
 		report.history = positions
 		report.duration = NumericStats.from_collection(positions, 'duration')
 		report.profit = NumericStats.from_collection(positions, 'profit')
-		report.win_rate = len([ position for position in positions if position.is_in_profit ]) / len(positions) * 100
+		if len(positions):
+			report.win_rate = len([ position for position in positions if position.is_in_profit ]) / len(positions) * 100
 		return report
 
 @dataclass
@@ -111,6 +117,30 @@ class BacktestReport:
 		report.strategy = strategy
 		report.timesteps = TimestepsReport.from_timesteps(broker.timesteps)
 		report.equity = EquityReport.from_curve(broker.equity_curve)
-		report.orders = OrdersReport.from_orders(broker.orders)
-		report.positions = PositionsReport.from_positions(broker.positions)
+		report.orders = OrdersReport.from_orders(list(broker.orders))
+		report.positions = PositionsReport.from_positions(list(broker.positions))
+		return report
+
+@dataclass
+class WalkForwardFoldReport:
+	train: TimeWindow = None
+	test: TimeWindow = None
+	backtest: BacktestReport = None
+
+@dataclass
+class WalkForwardReport:
+	created_at: pandas.Timestamp = None
+	folds: list[WalkForwardFoldReport] = None
+	return_percentage: NumericStats = None
+	max_drawdown_percentage: NumericStats = None
+	win_rate: NumericStats = None
+
+	@classmethod
+	def from_folds(cls, folds: list[WalkForwardFoldReport]):
+		report = cls()
+		report.created_at = now()
+		report.folds = folds
+		report.return_percentage = NumericStats.from_collection([ fold.backtest.equity.return_percentage for fold in folds ])
+		report.max_drawdown_percentage = NumericStats.from_collection([ fold.backtest.equity.max_drawdown_percentage for fold in folds ])
+		report.win_rate = NumericStats.from_collection([ fold.backtest.positions.win_rate for fold in folds ])
 		return report
\ No newline at end of file
@@ -1,10 +1,17 @@
 import typing
+import heapq
+import itertools
 import functools
 import pandas
 
 class Scheduler:
 	def __init__(self):
+		# Heap of (timestamp in nanoseconds, sequence, timestamp, action). The sequence keeps actions scheduled for the same timestamp in insertion order.
 		self.queue = []
+		self.sequence = itertools.count()
+
+	def __len__(self):
+		return len(self.queue)
 
 	def add(
 		self,
@@ -13,19 +20,24 @@ class Scheduler:
 		args = [],
 		kwargs = {},
 	):
-		self.queue.append({
-			'timestamp': timestamp,
-			'action': functools.partial(action, *args, **kwargs)
-		})
+		heapq.heappush(self.queue, (
+			timestamp.value,
+			next(self.sequence),
+			timestamp,
+			functools.partial(action, *args, **kwargs)
+		))
+
+	@property
+	def next_due_timestamp(self) -> pandas.Timestamp:
+		return self.queue[0][2] if self.queue else None
+
+	def is_due(self, now: pandas.Timestamp) -> bool:
+		return len(self.queue) != 0 and self.queue[0][0] <= now.value
 
 	def run_as_of(self, now: pandas.Timestamp):
-		self.queue.sort(key = lambda item: item['timestamp'])
-		to_run, to_defer = [], []
-		for item in self.queue:
-			if item['timestamp'] <= now:
-				to_run.append(item)
-			else:
-				to_defer.append(item)
-		self.queue = to_defer
-		for item in to_run:
-			item['action']()
\ No newline at end of file
+		# Pop everything that's due before running so actions scheduled by these actions wait for the next run
+		to_run = []
+		while self.is_due(now):
+			to_run.append(heapq.heappop(self.queue)[-1])
+		for action in to_run:
+			action()
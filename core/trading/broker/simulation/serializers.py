@@ -1,12 +1,44 @@
+import zlib
+import numpy
 import pandas
+from bson import Binary
 from core.utils.serializer import Serializer
 
+class SeriesBinarySerializer(Serializer):
+	"""Stores a time series as two compressed columns instead of a document per timestamp.
+	The index is delta encoded as int64 nanoseconds since regular timesteps compress down to almost nothing."""
+	encoding = 'zlib-delta-int64-float64'
+
+	def to_document(self, series: pandas.Series) -> dict:
+		timestamps = series.index.asi8
+		return {
+			'encoding' : self.encoding,
+			'name' : series.name,
+			'length' : len(series),
+			'timezone' : str(series.index.tz) if series.index.tz else None,
+			'index' : Binary(zlib.compress(numpy.diff(timestamps, prepend = 0).astype('<i8').tobytes())),
+			'values' : Binary(zlib.compress(series.to_numpy(dtype = 'float64').astype('<f8').tobytes())),
+		}
+
+	def to_series(self, document: dict) -> pandas.Series:
+		timestamps = numpy.cumsum(numpy.frombuffer(zlib.decompress(document['index']), dtype = '<i8'))
+		index = pandas.DatetimeIndex(timestamps.astype('datetime64[ns]'))
+		if document['timezone']:
+			index = index.tz_localize('UTC').tz_convert(document['timezone'])
+		return pandas.Series(
+			numpy.frombuffer(zlib.decompress(document['values']), dtype = '<f8'),
+			index = index,
+			name = document['name'],
+		)
+
 class DataClassMongoDocumentSerializer(Serializer):
+	series_serializer = SeriesBinarySerializer()
+
 	def to_mongo_document(self, value):
 		_type = type(value)
 
 		# Exceptional non-primitive data types that pymongo can consume 
-		if _type in [ pandas.Timestamp ]:
+		if _type in [ pandas.Timestamp, Binary, bytes ]:
 			return value
 
 		# Data types that we don't have any other options for
@@ -19,6 +51,9 @@ class DataClassMongoDocumentSerializer(Serializer):
 		if _type == dict:
 			return { key: self.to_mongo_document(value[key]) for key in value }
 
+		if _type == pandas.Series and isinstance(value.index, pandas.DatetimeIndex):
+			return self.series_serializer.to_document(value)
+
 		if _type == pandas.Series:
 			return self.to_mongo_document([
 				dict(timestamp=timestamp, value=value)
@@ -41,3 +76,15 @@ class DataClassMongoDocumentSerializer(Serializer):
 				result[field_name] = self.to_mongo_document(field_value)
 			return self.to_mongo_document(result)
 		return value
+
+	def from_mongo_document(self, document):
+		"""Restores the series that `to_mongo_document` packed into binary columns, leaves everything else as stored"""
+		if type(document) == list:
+			return [ self.from_mongo_document(item) for item in document ]
+
+		if type(document) == dict and document.get('encoding') == self.series_serializer.encoding:
+			return self.series_serializer.to_series(document)
+
+		if type(document) == dict:
+			return { key: self.from_mongo_document(document[key]) for key in document }
+		return document
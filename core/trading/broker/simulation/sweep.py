@@ -0,0 +1,92 @@
+import typing
+import itertools
+import pandas
+from multiprocess import Pool
+from dataclasses import dataclass, field, fields
+
+from core.trading.chart import Chart, Symbol
+from core.utils.logging import Logger
+from . import SimulationBroker
+from . import prices
+from .prices import PricePaths, attach_price_paths
+
+if typing.TYPE_CHECKING:
+	from core.trading.strategy import Strategy
+
+logger = Logger(__name__)
+
+@dataclass
+class BacktestSweep:
+	"""Backtests a strategy with every combination of a parameter grid over a process pool.
+	The price paths are read once, shared read-only with the workers and the reports are written in one bulk insert.
+	Strategies get built from the grid values plus the worker's `broker` and `repository` if they have such fields,
+	so every other field needs a default."""
+	strategy: type['Strategy'] = None
+	grid: dict[str, list] = field(default_factory = dict)
+	symbols: list[Symbol] = None
+	timesteps: Chart or pandas.DatetimeIndex = None
+	event_driven: bool = False
+	workers: int = None
+	broker: SimulationBroker = field(default_factory = SimulationBroker)
+
+	def __post_init__(self):
+		self.broker.timesteps = self.timesteps
+
+	@property
+	def combinations(self) -> list[dict]:
+		return [
+			dict(zip(self.grid.keys(), values))
+			for values in itertools.product(*self.grid.values())
+		]
+
+	def run(self) -> list[dict]:
+		combinations = self.combinations
+		price_paths = PricePaths(
+			repository = self.broker.repository,
+			timesteps = self.broker.timesteps,
+		)
+		price_paths.load(self.symbols)
+
+		logger.info(f'Backtesting {len(combinations)} combinations of {self.strategy.__name__}...')
+		memory, shared = price_paths.to_shared_memory()
+		try:
+			with Pool(self.workers, initializer = attach_price_paths, initargs = (shared, self.broker.repository)) as pool:
+				documents = pool.map(self.backtest_worker, combinations)
+		finally:
+			memory.close()
+			memory.unlink()
+
+		collection = self.broker.backtest_reports.get_collection(self.strategy.__name__)
+		collection.insert_many(documents)
+		logger.info(f'Wrote {len(documents)} backtest reports of {self.strategy.__name__}.')
+		return documents
+
+	def backtest_worker(self, parameters: dict) -> dict:
+		broker = SimulationBroker(
+			initial_cash = self.broker.initial_cash,
+			currency = self.broker.currency,
+			latency = self.broker.latency,
+			repository = prices.worker_price_paths.repository,
+		)
+		broker.timesteps = prices.worker_price_paths.timesteps
+
+		report = broker.backtest(
+			self.build_strategy(broker, parameters),
+			symbols = self.symbols,
+			event_driven = self.event_driven,
+			price_paths = prices.worker_price_paths,
+			write_report = False,
+		)
+		return broker.dataclass_serializer.to_mongo_document(report)
+
+	def build_strategy(self, broker: SimulationBroker, parameters: dict) -> 'Strategy':
+		# Hand the broker and its repository to strategies that take them
+		dependencies = {
+			'broker' : broker,
+			'repository' : broker.repository,
+		}
+		field_names = [ field.name for field in fields(self.strategy) ]
+		return self.strategy(
+			**{ name: value for name, value in dependencies.items() if name in field_names },
+			**parameters
+		)
@@ -0,0 +1,103 @@
+import typing
+from multiprocess import Pool
+from dataclasses import dataclass
+
+from core.trading.chart import Symbol
+from core.trading.interval import Interval
+from core.utils.time import TimeWindow
+from core.utils.logging import Logger
+from . import prices
+from .prices import PricePaths, attach_price_paths
+from .report import WalkForwardFoldReport, WalkForwardReport
+
+if typing.TYPE_CHECKING:
+	from core.trading.strategy import Strategy
+	from . import SimulationBroker
+
+logger = Logger(__name__)
+
+@dataclass
+class WalkForwardFold:
+	train: TimeWindow = None
+	test: TimeWindow = None
+
+	@classmethod
+	def split(
+		cls,
+		time_window: TimeWindow,
+		train: Interval,
+		test: Interval,
+		step: Interval = None,
+	) -> list['WalkForwardFold']:
+		"""Rolls a train window followed by a test window over `time_window` moving `step` (defaults to `test`) at a time"""
+		train = train.to_pandas_timedelta()
+		test = test.to_pandas_timedelta()
+		step = step.to_pandas_timedelta() if step else test
+
+		folds = []
+		from_timestamp = time_window.from_timestamp
+		while from_timestamp + train + test <= time_window.to_timestamp:
+			folds.append(cls(
+				train = TimeWindow(from_timestamp, from_timestamp + train),
+				test = TimeWindow(from_timestamp + train, from_timestamp + train + test),
+			))
+			from_timestamp += step
+		return folds
+
+@dataclass
+class WalkForward:
+	"""Backtests every test fold of a walk-forward split against one in-memory copy of the price paths.
+	`build_strategy` gets a fresh broker and the fold so it can (re)train on `fold.train` before the fold gets backtested."""
+	broker: 'SimulationBroker' = None
+	build_strategy: typing.Callable[['SimulationBroker', WalkForwardFold], 'Strategy'] = None
+	folds: list[WalkForwardFold] = None
+	symbols: list[Symbol] = None
+	event_driven: bool = False
+	workers: int = 1
+
+	def run(self) -> WalkForwardReport:
+		price_paths = PricePaths(
+			repository = self.broker.repository,
+			timesteps = self.broker.timesteps,
+		)
+		price_paths.load(self.symbols)
+		logger.info(f'Walking forward over {len(self.folds)} folds...')
+
+		if self.workers == 1:
+			fold_reports = [ self.backtest_fold(fold, price_paths) for fold in self.folds ]
+		else:
+			memory, shared = price_paths.to_shared_memory()
+			try:
+				with Pool(self.workers, initializer = attach_price_paths, initargs = (shared, self.broker.repository)) as pool:
+					fold_reports = pool.map(self.backtest_fold_worker, self.folds)
+			finally:
+				memory.close()
+				memory.unlink()
+
+		return WalkForwardReport.from_folds(fold_reports)
+
+	def backtest_fold_worker(self, fold: WalkForwardFold) -> WalkForwardFoldReport:
+		return self.backtest_fold(fold, prices.worker_price_paths)
+
+	def backtest_fold(self, fold: WalkForwardFold, price_paths: PricePaths) -> WalkForwardFoldReport:
+		start, stop = price_paths.timesteps.searchsorted([ fold.test.from_timestamp, fold.test.to_timestamp ])
+		broker: 'SimulationBroker' = type(self.broker)(
+			initial_cash = self.broker.initial_cash,
+			currency = self.broker.currency,
+			latency = self.broker.latency,
+			repository = self.broker.repository,
+		)
+		broker.timesteps = price_paths.timesteps[start:stop]
+
+		logger.info(f'Backtesting fold from {fold.test.from_timestamp} to {fold.test.to_timestamp}...')
+		return WalkForwardFoldReport(
+			train = fold.train,
+			test = fold.test,
+			backtest = broker.backtest(
+				self.build_strategy(broker, fold),
+				symbols = self.symbols,
+				event_driven = self.event_driven,
+				price_paths = price_paths.slice(start, stop),
+				write_report = False,
+			)
+		)
@@ -1,11 +1,71 @@
+import numpy
 import typing
 import pandas
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from dataclasses import dataclass, field
 
 if typing.TYPE_CHECKING:
 	from core.trading.broker.broker import Broker
+	from core.trading.repository import Repository
 from core.trading.chart.chart import Chart
 
+@lru_cache(maxsize = 64)
+def get_column_layout(columns: tuple[tuple[str, str]], names: tuple[str]) -> tuple[pandas.MultiIndex, numpy.ndarray]:
+	"""Sorted `(chart, field)` columns and the position every one of `columns` lands at in them"""
+	index, indexer = pandas.MultiIndex.from_tuples(columns, names = names).sort_values(return_indexer = True)
+	destinations = numpy.empty(len(indexer), dtype = 'int64')
+	destinations[indexer] = numpy.arange(len(indexer))
+	destinations.flags.writeable = False
+	return index, destinations
+
+def assemble_dataframe(
+	timestamps: list[numpy.ndarray],
+	values: list[numpy.ndarray],
+	columns: typing.Iterable[tuple[str, str]],
+	names: tuple[str] = None,
+) -> pandas.DataFrame:
+	"""Aligns the `(bars, fields)` values of every chart on the union of their timestamps in a single float block.
+	`columns` are the `(chart, field)` columns of the blocks in the order given and come out sorted."""
+	names = tuple(names or getattr(columns, 'names', None) or [ None, None ])
+	columns, destinations = get_column_layout(tuple(columns), names)
+	index = numpy.unique(numpy.concatenate(timestamps)) if len(timestamps) else numpy.empty(0, dtype = 'int64')
+
+	block = numpy.full((len(index), len(columns)), numpy.nan)
+	offset = 0
+	for chart_timestamps, chart_values in zip(timestamps, values):
+		width = chart_values.shape[1]
+		block[numpy.searchsorted(index, chart_timestamps)[:, None], destinations[offset:offset + width]] = chart_values
+		offset += width
+
+	return pandas.DataFrame(
+		block,
+		index = pandas.DatetimeIndex(index.view('datetime64[ns]'), name = 'timestamp').tz_localize('UTC'),
+		columns = columns,
+		copy = False,
+	)
+
+def assemble_dataframes(dataframes: list[pandas.DataFrame]) -> pandas.DataFrame:
+	"""Joins the dataframes of the charts of a group on their timestamps with sorted `(chart, field)` columns.
+	Charts with non-numeric fields get concatenated instead of blocked."""
+	can_be_blocked = len(dataframes) and all(
+		isinstance(dataframe.columns, pandas.MultiIndex)
+		and isinstance(dataframe.index, pandas.DatetimeIndex)
+		and str(dataframe.index.tz) == 'UTC'
+		and all(pandas.api.types.is_numeric_dtype(dtype) for dtype in dataframe.dtypes)
+		for dataframe in dataframes
+	)
+	if not can_be_blocked:
+		dataframe = pandas.concat(dataframes, axis=1)
+		return dataframe.reindex(dataframe.columns.sort_values(), axis=1)
+
+	return assemble_dataframe(
+		timestamps = [ dataframe.index.asi8 for dataframe in dataframes ],
+		values = [ dataframe.to_numpy(dtype = 'float64') for dataframe in dataframes ],
+		columns = [ column for dataframe in dataframes for column in dataframe.columns ],
+		names = dataframes[0].columns.names,
+	)
+
 @dataclass
 class ChartGroup:
 	charts: list[Chart] = field(default_factory=list)
@@ -34,13 +94,41 @@ class ChartGroup:
 
 	def read(self, **overrides):
 		self.dataframe = None
-		for chart in self.charts:
-			chart.read(**overrides)
+		repository = self.get_repository(overrides.get('repository'))
+		# Indicators run on the bars of their own chart so charts that have them get read one by one
+		has_indicators = overrides.get('refresh_indicators', True) and any(len(chart.indicators) for chart in self.charts)
+		if hasattr(repository, 'read_chart_group') and not has_indicators and repository.can_read_chart_group(self, **overrides):
+			overrides.pop('repository', None)
+			overrides.pop('refresh_indicators', None)
+			self.dataframe = repository.read_chart_group(self, **overrides)
+			return
+
+		workers = min(self.get_concurrent_reads(overrides.get('repository')), len(self.charts))
+		if workers > 1:
+			with ThreadPoolExecutor(workers) as executor:
+				list(executor.map(lambda chart: chart.read(**overrides), self.charts))
+		else:
+			for chart in self.charts:
+				chart.read(**overrides)
 
 		dataframes = []
 		for chart in self.charts:
 			dataframes.append(chart.dataframe)
 			chart.dataframe = None
-		dataframe = pandas.concat(dataframes, axis=1)
-		dataframe = dataframe.reindex(dataframe.columns.sort_values(), axis=1)
-		self.dataframe = dataframe
\ No newline at end of file
+		self.dataframe = assemble_dataframes(dataframes)
+
+	def get_repository(self, repository: 'Repository' = None) -> 'Repository':
+		"""The repository every chart gets read from, `None` if they don't share one"""
+		if repository:
+			return repository
+		repositories = { id(chart.repository): chart.repository for chart in self.charts }
+		if len(repositories) == 1:
+			return next(iter(repositories.values()))
+		return None
+
+	def get_concurrent_reads(self, repository: 'Repository' = None) -> int:
+		"""How many of the charts can be read at the same time given the repositories they're read from"""
+		repositories = [ repository ] if repository else [ chart.repository for chart in self.charts if chart.repository ]
+		if len(repositories) == 0:
+			return 1
+		return min(type(chart_repository).concurrent_reads for chart_repository in repositories)
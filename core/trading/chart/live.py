@@ -0,0 +1,118 @@
+import numpy
+import pandas
+from dataclasses import dataclass
+
+from core.trading.chart.group import ChartGroup, assemble_dataframe
+from core.utils.time import TimestampLike, normalize_timestamp
+from core.utils.logging import Logger
+
+logger = Logger(__name__)
+
+@dataclass
+class ChartBuffer:
+	"""Ring buffer of the last `capacity` bars of a chart"""
+	capacity: int = None
+
+	def __post_init__(self):
+		self.timestamps = numpy.empty(self.capacity, dtype = 'int64')
+		self.values: numpy.ndarray = None
+		self.columns: pandas.Index = None
+		self.position = 0 # where the next bar gets written
+		self.count = 0
+
+	def __len__(self):
+		return self.count
+
+	@property
+	def last_timestamp(self) -> pandas.Timestamp:
+		if self.count == 0:
+			return None
+		return pandas.Timestamp(self.timestamps[(self.position - 1) % self.capacity], tz = 'UTC')
+
+	def clear(self):
+		self.position = 0
+		self.count = 0
+
+	def extend(self, dataframe: pandas.DataFrame):
+		"""Appends the bars of `dataframe`. Bars already in the buffer as of its first bar (i.e. a bar that was still forming) get replaced."""
+		if len(dataframe) == 0:
+			return
+		if self.values is None or not dataframe.columns.equals(self.columns):
+			self.columns = dataframe.columns
+			self.values = numpy.empty((self.capacity, len(self.columns)), dtype = 'float64')
+			self.clear()
+
+		timestamps = dataframe.index.asi8
+		while self.count and self.timestamps[(self.position - 1) % self.capacity] >= timestamps[0]:
+			self.position -= 1
+			self.count -= 1
+
+		values = dataframe.to_numpy(dtype = 'float64')[-self.capacity:]
+		timestamps = timestamps[-self.capacity:]
+		positions = (self.position + numpy.arange(len(values))) % self.capacity
+		self.timestamps[positions] = timestamps
+		self.values[positions] = values
+		self.position = (self.position + len(values)) % self.capacity
+		self.count = min(self.count + len(values), self.capacity)
+
+	def to_arrays(self) -> tuple[numpy.ndarray, numpy.ndarray]:
+		"""Timestamps and values of the bars held, oldest first"""
+		positions = (self.position - self.count + numpy.arange(self.count)) % self.capacity
+		return self.timestamps[positions], self.values[positions]
+
+	def to_dataframe(self) -> pandas.DataFrame:
+		timestamps, values = self.to_arrays()
+		return pandas.DataFrame(
+			values,
+			index = pandas.DatetimeIndex(timestamps.view('datetime64[ns]'), name = 'timestamp').tz_localize('UTC'),
+			columns = self.columns,
+		)
+
+@dataclass
+class LiveChartGroup:
+	"""Keeps the last `bars` bars of every chart of a chart group in memory and only reads the bars since the last update.
+	The last bar held is re-read on every update since it might have still been forming."""
+	chart_group: ChartGroup = None
+	bars: int = None
+
+	def __post_init__(self):
+		self.buffers = {
+			chart.name: ChartBuffer(capacity = self.bars)
+			for chart in self.chart_group.charts
+		}
+
+	def update(self, to_timestamp: TimestampLike = None) -> ChartGroup:
+		to_timestamp = normalize_timestamp(to_timestamp)
+		for chart in self.chart_group.charts:
+			buffer = self.buffers[chart.name]
+			# i.e. a new backtest started, or the buffer went stale
+			if len(buffer) and to_timestamp and to_timestamp < buffer.last_timestamp:
+				buffer.clear()
+
+			if len(buffer):
+				chart.read(
+					from_timestamp = buffer.last_timestamp,
+					to_timestamp = to_timestamp,
+					count = None,
+					refresh_indicators = False,
+				)
+			else:
+				chart.read(
+					count = self.bars,
+					to_timestamp = to_timestamp,
+					refresh_indicators = False,
+				)
+			buffer.extend(chart.dataframe)
+			chart.dataframe = None
+
+		buffers = [ buffer for buffer in self.buffers.values() if buffer.columns is not None ]
+		arrays = [ buffer.to_arrays() for buffer in buffers ]
+		self.chart_group.dataframe = assemble_dataframe(
+			timestamps = [ timestamps for timestamps, _ in arrays ],
+			values = [ values for _, values in arrays ],
+			columns = [ column for buffer in buffers for column in buffer.columns ],
+			names = buffers[0].columns.names if len(buffers) else None,
+		)
+		for chart in self.chart_group.charts:
+			chart.refresh_indicators()
+		return self.chart_group
@@ -0,0 +1,82 @@
+import numpy
+import pandas
+from numpy.lib.stride_tricks import sliding_window_view
+from dataclasses import dataclass
+
+from core.trading.chart.group import ChartGroup
+from core.utils.time import TimestampLike, normalize_timestamp
+
+@dataclass
+class MaterializedChartGroup:
+	"""Whole history of a chart group read once into a single read-only `(timestamps, columns)` array.
+	Windows of it are taken by position as views so reading a sample doesn't touch the repository."""
+	chart_group: ChartGroup = None
+
+	def __post_init__(self):
+		dataframe = self.chart_group.dataframe
+		self.index: pandas.DatetimeIndex = dataframe.index
+		self.timestamps = dataframe.index.asi8
+		self.columns: pandas.MultiIndex = dataframe.columns
+		self.values = dataframe.to_numpy(dtype = 'float64')
+		self.values.flags.writeable = False
+
+	def __len__(self):
+		return len(self.timestamps)
+
+	@classmethod
+	def read(
+		cls,
+		chart_group: ChartGroup,
+		from_timestamp: TimestampLike = None,
+		to_timestamp: TimestampLike = None,
+		**overrides
+	) -> 'MaterializedChartGroup':
+		chart_group.read(
+			from_timestamp = normalize_timestamp(from_timestamp),
+			to_timestamp = normalize_timestamp(to_timestamp),
+			**overrides
+		)
+		return cls(chart_group)
+
+	def get_bounds_before(self, timestamp: pandas.Timestamp, count: int) -> tuple[int, int]:
+		"""Positions of the `count` bars before the last bar as of `timestamp`. The last bar itself is left out to prevent hindsight."""
+		stop = max(numpy.searchsorted(self.timestamps, timestamp.value, side = 'right') - 1, 0)
+		return max(stop - count, 0), stop
+
+	def get_bounds_after(self, timestamp: pandas.Timestamp, count: int) -> tuple[int, int]:
+		"""Positions of the `count` bars after the first bar as of `timestamp`. The first bar itself is left out to prevent hindsight."""
+		start = min(numpy.searchsorted(self.timestamps, timestamp.value, side = 'left') + 1, len(self))
+		return start, min(start + count, len(self))
+
+	def get_stops_as_of(self, timestamps: pandas.DatetimeIndex) -> numpy.ndarray:
+		"""Positions right after the last bar as of every timestamp, i.e. windows ending there include that bar"""
+		return numpy.searchsorted(self.timestamps, timestamps.asi8, side = 'right')
+
+	def get_stops_before(self, timestamps: pandas.DatetimeIndex) -> numpy.ndarray:
+		"""`get_bounds_before` stops of many timestamps at once"""
+		return numpy.maximum(self.get_stops_as_of(timestamps) - 1, 0)
+
+	def get_starts_after(self, timestamps: pandas.DatetimeIndex) -> numpy.ndarray:
+		"""`get_bounds_after` starts of many timestamps at once"""
+		return numpy.minimum(numpy.searchsorted(self.timestamps, timestamps.asi8, side = 'left') + 1, len(self))
+
+	def get_windows(self, stops: numpy.ndarray, count: int) -> numpy.ndarray:
+		"""`(len(stops), count, columns)` view-backed gather of the `count` bars before every position in `stops`"""
+		stops = numpy.asarray(stops)
+		if len(stops) and (stops.min() < count or stops.max() > len(self)):
+			raise Exception(f'Windows of {count} bars ending between {stops.min()} and {stops.max()} do not fit in the {len(self)} materialized bars.')
+		windows = sliding_window_view(self.values, count, axis = 0)
+		return windows[stops - count].swapaxes(1, 2)
+
+	def to_dataframe(self, start: int, stop: int) -> pandas.DataFrame:
+		return pandas.DataFrame(
+			self.values[start:stop],
+			index = self.index[start:stop],
+			columns = self.columns,
+			copy = False,
+		)
+
+	def to_chart_group(self, chart_group: ChartGroup, start: int, stop: int) -> ChartGroup:
+		"""Populates a chart group built with the same charts with the bars in `[start, stop)`"""
+		chart_group.dataframe = self.to_dataframe(start, stop)
+		return chart_group
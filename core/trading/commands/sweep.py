@@ -0,0 +1,47 @@
+import os
+import json
+from argparse import BooleanOptionalAction
+
+from core.trading.broker.simulation.sweep import BacktestSweep
+from core.trading.chart import CandleStickChart
+from core.trading.interval import Interval
+from core.utils.time import normalize_timestamp, now
+from core.utils.module import import_module
+from core.utils.logging import Logger
+from core.utils.serializer import RepresentationSerializer
+from core.utils.command import CommandSession
+
+logger = Logger(__name__)
+
+def import_class(path: str) -> type:
+	module_path, class_name = path.rsplit('.', 1)
+	return getattr(import_module(module_path), class_name)
+
+class SweepCommandSession(CommandSession):
+	def setup(self):
+		super().setup()
+		self.parser.add_argument('strategy', type = import_class, help = "import path of a strategy class that can be built from its `broker`, `repository` and --grid fields alone, every other field needs a default")
+		self.parser.add_argument('--grid', type = json.loads, default = {}, help = 'JSON object of strategy field names to the list of values to try')
+		self.parser.add_argument('--symbol', nargs = '+', required = True)
+		self.parser.add_argument('--interval', type = RepresentationSerializer(Interval).deserialize, default = Interval.Minute(1))
+		self.parser.add_argument('--from', dest = 'from_timestamp', type = normalize_timestamp, required = True)
+		self.parser.add_argument('--to', dest = 'to_timestamp', type = normalize_timestamp, default = now())
+		self.parser.add_argument('--event-driven', action = BooleanOptionalAction, default = False)
+		self.parser.add_argument('--workers', type = int, default = os.cpu_count())
+
+	def run(self):
+		super().run()
+		sweep = BacktestSweep(
+			strategy = self.args.strategy,
+			grid = self.args.grid,
+			symbols = self.args.symbol,
+			timesteps = CandleStickChart(
+				symbol = self.args.symbol[0],
+				interval = self.args.interval,
+				from_timestamp = self.args.from_timestamp,
+				to_timestamp = self.args.to_timestamp,
+			),
+			event_driven = self.args.event_driven,
+			workers = self.args.workers,
+		)
+		sweep.run()
@@ -16,6 +16,8 @@ ChartCombinations = dict[
 @dataclass
 class Repository:
 	timezone: ClassVar[str] = 'UTC'
+	# How many charts can be read from the repository at the same time, i.e. by `ChartGroup.read`
+	concurrent_reads: ClassVar[int] = 1
 
 	@property
 	def now(self):
@@ -1,12 +1,18 @@
+import numpy
 import pandas
 import pymongo
 from pymongo.collection import Collection
 from multiprocess import Pool
-from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, fields
 from typing import TYPE_CHECKING
 
 from .serializers import SimulationSerializers
-from core.trading.chart import Chart, ChartGroup, OverriddenChart, CandleStickChart
+from .prices import PricePath
+from .cache import PriceCache
+from .store import ChartStore
+from core.trading.chart import Chart, ChartGroup, OverriddenChart, CandleStickChart, Symbol
+from core.trading.chart.group import assemble_dataframe
 from core.trading.repository.repository import Repository
 from core.trading.interval import Interval
 from core.utils.time import TimeWindow, normalize_timestamp
@@ -22,6 +28,9 @@ logger = Logger(__name__)
 @dataclass
 class SimulationRepository(Repository, MongoRepository):
 	serializers = SimulationSerializers()
+	concurrent_reads = 8 # the mongo client is thread-safe and pools its connections
+	price_cache: PriceCache = field(default_factory = PriceCache, repr = False)
+	store: ChartStore = field(default = None, repr = False)
 
 	def __post_init__(self):
 		self._now = None
@@ -41,8 +50,13 @@ class SimulationRepository(Repository, MongoRepository):
 		database: str = None,
 		**overrides
 	) -> pandas.DataFrame:
-		database = self.client[database] if database else self.historical_data
 		chart = OverriddenChart(chart, overrides)
+		if self.store and not (collection or database or chart.count) and chart.from_timestamp and chart.to_timestamp:
+			dataframe = self.read_chart_from_store(chart)
+			if type(dataframe) == pandas.DataFrame:
+				return dataframe
+
+		database = self.client[database] if database else self.historical_data
 		find_options = self.serializers.find_options.to_find_options(chart)
 
 		collection = collection or self.serializers.collection.to_collection_name(chart)
@@ -58,14 +72,104 @@ class SimulationRepository(Repository, MongoRepository):
 		logger.debug(f'Read chart:\n{dataframe}')
 		return dataframe
 
+	def can_read_chart_group(self, chart_group: ChartGroup, **overrides) -> bool:
+		"""Whether `read_chart_group` reads the group as reading its charts one by one would. Only charts with numeric fields from the historical data go in a float block."""
+		if overrides.get('collection') or overrides.get('database'):
+			return False
+		for chart in chart_group.charts:
+			types = { field.name: field.type for field in fields(chart.Record) }
+			if not all(field in types and pandas.api.types.is_numeric_dtype(types[field]) for field in OverriddenChart(chart, dict(overrides)).select):
+				return False
+		return True
+
+	def read_chart_group(
+		self,
+		chart_group: ChartGroup,
+		batch_size: int = 50000,
+		**overrides
+	) -> pandas.DataFrame:
+		"""Reads every chart of the group over a cursor of its own in parallel and puts the records straight into the group's aligned dataframe.
+		Only for groups `can_read_chart_group` accepts."""
+		charts = [ OverriddenChart(chart, overrides) for chart in chart_group.charts ]
+		with ThreadPoolExecutor(max(min(self.concurrent_reads, len(charts)), 1)) as executor:
+			arrays = list(executor.map(lambda chart: self.read_chart_arrays(chart, batch_size = batch_size), charts))
+
+		return assemble_dataframe(
+			timestamps = [ timestamps for timestamps, _ in arrays ],
+			values = [ values for _, values in arrays ],
+			columns = [ (chart.name, field) for chart in charts for field in chart.select ],
+			names = [ 'chart', 'field' ],
+		)
+
+	def read_chart_arrays(self, chart: OverriddenChart, batch_size: int = 50000) -> tuple[numpy.ndarray, numpy.ndarray]:
+		"""Ascending int64 timestamps and `(bars, selected fields)` float values of a chart"""
+		if self.store and not chart.count and chart.from_timestamp and chart.to_timestamp:
+			dataframe = self.read_chart_from_store(chart)
+			if type(dataframe) == pandas.DataFrame:
+				return dataframe.index.asi8, dataframe.droplevel(0, axis = 1).reindex(columns = chart.select).to_numpy(dtype = 'float64')
+
+		find_options = self.serializers.find_options.to_find_options(chart)
+		records = list(
+			self.historical_data
+				.get_collection(self.serializers.collection.to_collection_name(chart))
+				.find(**find_options, batch_size = batch_size)
+		)
+		timestamps = pandas.DatetimeIndex([ record['timestamp'] for record in records ])
+		if not timestamps.tz:
+			timestamps = timestamps.tz_localize('UTC')
+		timestamps = timestamps.asi8
+		values = numpy.array([ [ record.get(field) for field in chart.select ] for record in records ], dtype = 'float64').reshape(len(records), len(chart.select))
+
+		# Records read backwards from `to_timestamp` come in descending
+		order = numpy.argsort(timestamps, kind = 'stable')
+		return timestamps[order], values[order]
+
+	def read_chart_from_store(self, chart: OverriddenChart) -> pandas.DataFrame:
+		"""Serves the chart from `self.store` and only queries the ranges it doesn't have yet. Returns `None` if the store can't serve it."""
+		name = self.serializers.collection.to_collection_name(chart)
+		from_timestamp = normalize_timestamp(chart.from_timestamp)
+		to_timestamp = normalize_timestamp(chart.to_timestamp)
+
+		for missing_from_timestamp, missing_to_timestamp in self.store.get_missing_ranges(name, from_timestamp, to_timestamp):
+			logger.debug(f'Storing {name} from {missing_from_timestamp} to {missing_to_timestamp}...')
+			find_options = self.serializers.find_options.to_find_options(
+				OverriddenChart(chart, {
+					'from_timestamp' : missing_from_timestamp,
+					'to_timestamp' : missing_to_timestamp,
+				})
+			)
+			# Store every field regardless of what's selected
+			find_options['projection'] = { '_id' : False }
+			records = self.historical_data.get_collection(name).find(**find_options)
+			self.store.write(
+				name,
+				self.serializers.records.to_dataframe(records),
+				from_timestamp = missing_from_timestamp,
+				to_timestamp = missing_to_timestamp,
+			)
+
+		dataframe = self.store.read(name, from_timestamp, to_timestamp)
+		if type(dataframe) != pandas.DataFrame:
+			return None
+		return self.serializers.records.to_dataframe(
+			dataframe,
+			name = chart.name,
+			select = chart.select
+		)
+
 	def get_last_price(
 		self,
 		symbol,
 		timestamp: pandas.Timestamp = None,
 		intent: 'OrderType' = None,
 	) -> float:
-		if timestamp == None:
-			timestamp = self.now
+		timestamp = normalize_timestamp(timestamp) or self.now
+
+		if self.price_cache:
+			price = self.price_cache.get_last_price(self, symbol, timestamp)
+			if price != None:
+				return price
+
 		chart = CandleStickChart(
 			symbol = symbol,
 			interval = Interval.Minute(1),
@@ -75,6 +179,23 @@ class SimulationRepository(Repository, MongoRepository):
 		).read()
 		return chart.data['close'].iloc[0]
 
+	def read_price_path(
+		self,
+		symbol: Symbol,
+		from_timestamp: TimestampLike = None,
+		to_timestamp: TimestampLike = None,
+		interval: Interval = Interval.Minute(1),
+	) -> PricePath:
+		chart = CandleStickChart(
+			symbol = symbol,
+			interval = interval,
+			from_timestamp = from_timestamp,
+			to_timestamp = to_timestamp,
+			select = PricePath.fields,
+			repository = self,
+		).read(refresh_indicators = False)
+		return PricePath.from_dataframe(chart.data, symbol = symbol)
+
 	def write_chart(
 		self,
 		chart: Chart or OverriddenChart = None,
@@ -101,6 +222,11 @@ class SimulationRepository(Repository, MongoRepository):
 			records = records
 		)
 
+		if self.price_cache:
+			self.price_cache.invalidate(chart.symbol)
+		if self.store:
+			self.store.invalidate(self.serializers.collection.to_collection_name(chart))
+
 	def remove_historical_data(
 		self,
 		chart: Chart or OverriddenChart = None,
@@ -110,6 +236,11 @@ class SimulationRepository(Repository, MongoRepository):
 		collection = self.serializers.collection.to_collection_name(chart)
 		self.historical_data.drop_collection(collection)
 
+		if self.price_cache:
+			self.price_cache.invalidate(chart.symbol)
+		if self.store:
+			self.store.invalidate(self.serializers.collection.to_collection_name(chart))
+
 	def get_common_time_window(
 		self,
 		chart_group: ChartGroup or OverriddenChart or list[Chart] = None,
@@ -0,0 +1,78 @@
+import typing
+import pandas
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from core.trading.chart import Symbol
+from core.trading.interval import Interval
+from core.utils.time import TimeWindow
+from core.utils.logging import Logger
+from .prices import PricePath
+
+if typing.TYPE_CHECKING:
+	from core.trading.repository.simulation import SimulationRepository
+
+logger = Logger(__name__)
+
+@dataclass
+class PriceWindow(TimeWindow):
+	path: PricePath = None
+
+@dataclass
+class PriceCache:
+	"""Keeps a sliding window of 1-minute bars per symbol in memory and evicts the least recently used symbols"""
+	lookahead: Interval = Interval.Day(7)
+	lookbehind: Interval = Interval.Hour(1)
+	max_symbols: int = 64
+
+	def __post_init__(self):
+		self.windows: OrderedDict[Symbol, PriceWindow] = OrderedDict()
+
+	def __contains__(self, symbol: Symbol):
+		return symbol in self.windows
+
+	def get_last_price(
+		self,
+		repository: 'SimulationRepository',
+		symbol: Symbol,
+		timestamp: pandas.Timestamp,
+	) -> float:
+		"""Returns `None` when the cache can't tell the price so the caller falls back to querying"""
+		window = self.windows.get(symbol)
+		if window == None or not (window.from_timestamp <= timestamp <= window.to_timestamp):
+			window = self.load(repository, symbol, timestamp)
+		self.windows.move_to_end(symbol)
+
+		return window.path.get_last_price(timestamp)
+
+	def load(
+		self,
+		repository: 'SimulationRepository',
+		symbol: Symbol,
+		timestamp: pandas.Timestamp,
+	) -> PriceWindow:
+		from_timestamp = timestamp - self.lookbehind.to_pandas_timedelta()
+		to_timestamp = timestamp + self.lookahead.to_pandas_timedelta()
+		logger.debug(f'Caching prices of {symbol} from {from_timestamp} to {to_timestamp}...')
+
+		window = PriceWindow(
+			from_timestamp = from_timestamp,
+			to_timestamp = to_timestamp,
+			path = repository.read_price_path(
+				symbol = symbol,
+				from_timestamp = from_timestamp,
+				to_timestamp = to_timestamp,
+				interval = Interval.Minute(1),
+			)
+		)
+
+		self.windows[symbol] = window
+		while len(self.windows) > self.max_symbols:
+			self.windows.popitem(last = False)
+		return window
+
+	def invalidate(self, symbol: Symbol = None):
+		if symbol == None:
+			self.windows.clear()
+		else:
+			self.windows.pop(symbol, None)
@@ -0,0 +1,93 @@
+import numpy
+import pandas
+from dataclasses import dataclass, field
+
+from core.trading.chart import Symbol
+from core.utils.time import TimestampLike, normalize_timestamp
+
+@dataclass
+class PricePath:
+	"""Columnar `high`/`low`/`close` arrays of a symbol indexed by nanosecond UTC timestamps"""
+	symbol: Symbol = None
+	timestamps: numpy.ndarray = field(default_factory = lambda: numpy.empty(0, dtype = 'int64'), repr = False)
+	high: numpy.ndarray = field(default_factory = lambda: numpy.empty(0), repr = False)
+	low: numpy.ndarray = field(default_factory = lambda: numpy.empty(0), repr = False)
+	close: numpy.ndarray = field(default_factory = lambda: numpy.empty(0), repr = False)
+
+	fields = [ 'high', 'low', 'close' ]
+
+	def __len__(self):
+		return len(self.timestamps)
+
+	@classmethod
+	def from_dataframe(
+		cls,
+		dataframe: pandas.DataFrame,
+		symbol: Symbol = None,
+	):
+		# Columns might still be wrapped in the chart name
+		if type(dataframe.columns) == pandas.MultiIndex:
+			dataframe = dataframe.droplevel(0, axis = 1)
+
+		return cls(
+			symbol = symbol,
+			timestamps = dataframe.index.asi8,
+			**{
+				name: dataframe[name].to_numpy(dtype = 'float64', na_value = numpy.nan)
+				for name in cls.fields
+			}
+		)
+
+	def index_as_of(self, timestamp: TimestampLike) -> int:
+		"""Position of the last bar at or before `timestamp`, `-1` if there is none"""
+		timestamp = normalize_timestamp(timestamp)
+		return int(numpy.searchsorted(self.timestamps, timestamp.value, side = 'right')) - 1
+
+	def get_last_price(self, timestamp: TimestampLike) -> float:
+		index = self.index_as_of(timestamp)
+		if index < 0:
+			return None
+		return self.close[index]
+
+	def slice(self, start: int = None, stop: int = None) -> 'PricePath':
+		"""Zero-copy view over a range of bars"""
+		return PricePath(
+			symbol = self.symbol,
+			timestamps = self.timestamps[start:stop],
+			**{
+				name: getattr(self, name)[start:stop]
+				for name in self.fields
+			}
+		)
+
+	def align(self, timestamps: pandas.DatetimeIndex or numpy.ndarray) -> 'PricePath':
+		"""Resamples the path onto `timestamps` so that bar `i` holds the last close as of `timestamps[i]`
+		and the high/low reached since `timestamps[i - 1]` so no crossings between two timestamps are missed"""
+		if isinstance(timestamps, pandas.DatetimeIndex):
+			timestamps = timestamps.asi8
+
+		ends = numpy.searchsorted(self.timestamps, timestamps, side = 'right')
+		starts = numpy.empty_like(ends)
+		starts[1:] = ends[:-1]
+		if len(ends):
+			starts[0] = max(ends[0] - 1, 0)
+
+		close = numpy.full(len(timestamps), numpy.nan)
+		has_price = ends > 0
+		close[has_price] = self.close[ends[has_price] - 1]
+
+		high, low = close.copy(), close.copy()
+		has_bars = ends > starts
+		length = ends[-1] if len(ends) else 0
+		if length:
+			indices = numpy.minimum(starts, length - 1)
+			high[has_bars] = numpy.maximum.reduceat(self.high[:length], indices)[has_bars]
+			low[has_bars] = numpy.minimum.reduceat(self.low[:length], indices)[has_bars]
+
+		return PricePath(
+			symbol = self.symbol,
+			timestamps = timestamps,
+			high = high,
+			low = low,
+			close = close,
+		)
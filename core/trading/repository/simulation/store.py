@@ -0,0 +1,192 @@
+import os
+import json
+import shutil
+import numpy
+import pandas
+from pathlib import Path
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+from core.utils.environment import project_directory, is_windows
+from core.utils.logging import Logger
+
+if is_windows:
+	import msvcrt
+else:
+	import fcntl
+
+logger = Logger(__name__)
+
+@contextmanager
+def lock_file(path: Path, shared: bool = False):
+	"""Holds a lock on `path` across threads and processes while the block runs. Shared locks are exclusive on Windows."""
+	with open(path, 'a+b') as file:
+		if is_windows:
+			file.seek(0)
+			while True:
+				try:
+					msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+					break
+				except OSError: # gives up after 10 seconds
+					continue
+			try:
+				yield
+			finally:
+				file.seek(0)
+				msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+		else:
+			fcntl.flock(file.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+			try:
+				yield
+			finally:
+				fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+
+@dataclass
+class ChartStore:
+	"""On-disk columnar copy of historical data. Every collection gets a directory with one `.npy` file per field
+	that is memory-mapped on read, plus the time ranges it has been filled for so only the gaps have to be queried.
+	Writes of a collection are serialized through a lock file next to its directory and every file gets swapped in whole,
+	the time ranges last so a range is never reported covered before its bars are on disk."""
+	directory: Path = field(default_factory = lambda: project_directory.joinpath('core/artifacts/charts'))
+
+	def get_path(self, name: str) -> Path:
+		return Path(self.directory).joinpath(name)
+
+	@contextmanager
+	def lock(self, name: str, shared: bool = False):
+		Path(self.directory).mkdir(parents = True, exist_ok = True)
+		with lock_file(Path(self.directory).joinpath(f'{name}.lock'), shared = shared):
+			yield
+
+	def get_coverage(self, name: str) -> list[list[int]]:
+		path = self.get_path(name).joinpath('coverage.json')
+		if not path.exists():
+			return []
+		return json.loads(path.read_text())
+
+	def get_missing_ranges(
+		self,
+		name: str,
+		from_timestamp: pandas.Timestamp,
+		to_timestamp: pandas.Timestamp,
+	) -> list[tuple[pandas.Timestamp, pandas.Timestamp]]:
+		missing = []
+		start = from_timestamp.value
+		is_covered = False
+		for covered_from, covered_to in self.get_coverage(name):
+			if covered_to < start:
+				continue
+			if covered_from > to_timestamp.value:
+				break
+			if covered_from > start:
+				missing.append((start, covered_from))
+			start = max(start, covered_to)
+			is_covered = True
+		if start < to_timestamp.value or not is_covered:
+			missing.append((start, to_timestamp.value))
+		return [
+			(pandas.Timestamp(from_value, tz = 'UTC'), pandas.Timestamp(to_value, tz = 'UTC'))
+			for from_value, to_value in missing
+		]
+
+	def read(
+		self,
+		name: str,
+		from_timestamp: pandas.Timestamp,
+		to_timestamp: pandas.Timestamp,
+	) -> pandas.DataFrame:
+		"""Returns `None` if the range is not fully stored"""
+		if len(self.get_missing_ranges(name, from_timestamp, to_timestamp)):
+			return None
+
+		# Files swapped in afterwards don't affect the ones already mapped, so the lock only has to cover mapping them
+		path = self.get_path(name)
+		with self.lock(name, shared = True):
+			timestamps = numpy.load(path.joinpath('timestamp.npy'), mmap_mode = 'r')
+			columns = {
+				field: numpy.load(path.joinpath(f'{field}.npy'), mmap_mode = 'r')
+				for field in json.loads(path.joinpath('fields.json').read_text())
+			}
+		start = numpy.searchsorted(timestamps, from_timestamp.value, side = 'left')
+		stop = numpy.searchsorted(timestamps, to_timestamp.value, side = 'right')
+
+		return pandas.DataFrame(
+			{ field: values[start:stop] for field, values in columns.items() },
+			index = pandas.DatetimeIndex(numpy.asarray(timestamps[start:stop]).view('datetime64[ns]'), name = 'timestamp').tz_localize('UTC'),
+		)
+
+	def write(
+		self,
+		name: str,
+		dataframe: pandas.DataFrame,
+		from_timestamp: pandas.Timestamp,
+		to_timestamp: pandas.Timestamp,
+	):
+		"""Merges the records read for `[from_timestamp, to_timestamp]` into the stored columns"""
+		if not all(pandas.api.types.is_numeric_dtype(dtype) for dtype in dataframe.dtypes):
+			logger.debug(f'Skipped storing {name} as it has non-numeric fields.')
+			return
+
+		path = self.get_path(name)
+		with self.lock(name):
+			path.mkdir(parents = True, exist_ok = True)
+			stored = self.read_all(name)
+			if stored is not None:
+				# Newly read records take precedence over the stored ones
+				dataframe = pandas.concat([ stored, dataframe ])
+				dataframe = dataframe[~dataframe.index.duplicated(keep = 'last')].sort_index()
+
+			self.save(path, 'timestamp', dataframe.index.asi8)
+			for field in dataframe.columns:
+				self.save(path, field, dataframe[field].to_numpy())
+			self.save_json(path, 'fields', list(dataframe.columns))
+
+			coverage = self.get_coverage(name) + [ [ from_timestamp.value, to_timestamp.value ] ]
+			self.save_json(path, 'coverage', self.merge_ranges(coverage))
+
+	def read_all(self, name: str) -> pandas.DataFrame:
+		"""Every stored record of `name`, to be called while holding its lock"""
+		path = self.get_path(name)
+		if not path.joinpath('fields.json').exists():
+			return None
+		timestamps = numpy.load(path.joinpath('timestamp.npy'))
+		return pandas.DataFrame(
+			{
+				field: numpy.load(path.joinpath(f'{field}.npy'))
+				for field in json.loads(path.joinpath('fields.json').read_text())
+			},
+			index = pandas.DatetimeIndex(timestamps.view('datetime64[ns]'), name = 'timestamp').tz_localize('UTC'),
+		)
+
+	def invalidate(self, name: str):
+		with self.lock(name):
+			shutil.rmtree(self.get_path(name), ignore_errors = True)
+
+	@staticmethod
+	def save(path: Path, field: str, values: numpy.ndarray):
+		# Write next to the file and swap so readers that have it mapped keep seeing the old one
+		temporary_path = path.joinpath(f'{field}.tmp.npy')
+		with open(temporary_path, 'wb') as file:
+			numpy.save(file, values)
+			file.flush()
+			os.fsync(file.fileno())
+		os.replace(temporary_path, path.joinpath(f'{field}.npy'))
+
+	@staticmethod
+	def save_json(path: Path, name: str, value):
+		temporary_path = path.joinpath(f'{name}.tmp.json')
+		with open(temporary_path, 'w') as file:
+			json.dump(value, file)
+			file.flush()
+			os.fsync(file.fileno())
+		os.replace(temporary_path, path.joinpath(f'{name}.json'))
+
+	@staticmethod
+	def merge_ranges(ranges: list[list[int]]) -> list[list[int]]:
+		merged = []
+		for from_value, to_value in sorted(ranges):
+			if len(merged) and from_value <= merged[-1][1]:
+				merged[-1][1] = max(merged[-1][1], to_value)
+			else:
+				merged.append([ from_value, to_value ])
+		return merged
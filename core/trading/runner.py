@@ -0,0 +1,57 @@
+import asyncio
+import typing
+import pandas
+from dataclasses import dataclass, field
+
+from core.trading.interval import Interval
+from core.utils.logging import Logger
+
+if typing.TYPE_CHECKING:
+	from core.trading.strategy import Strategy
+
+logger = Logger(__name__)
+
+@dataclass
+class BarCloseRunner:
+	"""Runs live strategies on the close of the bars of the intervals they subscribe to instead of in a busy loop.
+	Bars close on the same epoch-aligned boundaries `Strategy.get_decision_mask` uses in backtests, as told by the strategy's clock.
+	`delay` gives the data of a closed bar time to arrive before the strategy gets woken up."""
+	delay: pandas.Timedelta = field(default_factory = lambda: pandas.Timedelta(seconds = 1))
+	# Longest a sleep lasts so an aborted strategy stops in time
+	poll_interval: pandas.Timedelta = field(default_factory = lambda: pandas.Timedelta(seconds = 1))
+
+	@staticmethod
+	def get_next_close(interval: Interval, timestamp: pandas.Timestamp) -> pandas.Timestamp:
+		step = interval.to_pandas_timedelta().value
+		return pandas.Timestamp((timestamp.value // step + 1) * step, tz = timestamp.tz)
+
+	def run(self, strategies: list['Strategy']):
+		asyncio.run(self.run_async(strategies))
+
+	async def run_async(self, strategies: list['Strategy']):
+		await asyncio.gather(*[
+			self.subscribe(strategy, interval, lock)
+			for strategy, lock in [ (strategy, asyncio.Lock()) for strategy in strategies ]
+			for interval in strategy.subscriptions
+		])
+
+	async def subscribe(self, strategy: 'Strategy', interval: Interval, lock: asyncio.Lock):
+		step = interval.to_pandas_timedelta()
+		close = self.get_next_close(interval, strategy.now())
+		while not strategy.is_aborted:
+			# Sleeping is not exact so keep waiting until the clock actually got there
+			while not strategy.is_aborted and strategy.now() < close + self.delay:
+				remaining = close + self.delay - strategy.now()
+				await asyncio.sleep(max(min(remaining, self.poll_interval).total_seconds(), 0))
+			if strategy.is_aborted:
+				break
+
+			now = strategy.now()
+			missed = (now - close) // step
+			if missed:
+				logger.warn(f'{type(strategy).__name__} missed {missed} closes of {interval} bars since {close}. Catching up with the latest one.')
+
+			# The handler blocks (i.e. on the broker or model inference) so it runs in a thread, one at a time per strategy
+			async with lock:
+				await asyncio.to_thread(strategy.handler)
+			close = self.get_next_close(interval, now)
@@ -1,11 +1,19 @@
 import abc
-from dataclasses import dataclass
+import numpy
+import pandas
+from dataclasses import dataclass, field
+from core.trading.interval import Interval
+from core.trading.runner import BarCloseRunner
 from core.utils.logging import Logger
+from core.utils.time import now
 
 logger = Logger(__name__)
 
 @dataclass
 class Strategy:
+	# Keyword only so subclasses can still declare fields without defaults
+	decision_interval: Interval = field(default = None, kw_only = True)
+
 	def __post_init__(self):
 		self.is_aborted = False
 
@@ -16,12 +24,33 @@ class Strategy:
 	def handler(self):
 		pass
 
+	def get_decision_mask(self, timesteps: pandas.DatetimeIndex) -> numpy.ndarray:
+		"""Flags the timesteps `handler` should run on in an event-driven backtest.
+		Defaults to every timestep or, when `decision_interval` is set, the first timestep of every interval."""
+		if self.decision_interval == None:
+			return numpy.ones(len(timesteps), dtype = bool)
+
+		buckets = timesteps.asi8 // self.decision_interval.to_pandas_timedelta().value
+		return numpy.diff(buckets, prepend = buckets[:1] - 1) != 0
+
+	@property
+	def subscriptions(self) -> list[Interval]:
+		"""Intervals whose bar closes wake the strategy up when running live"""
+		return [ self.decision_interval ] if self.decision_interval else []
+
+	def now(self) -> pandas.Timestamp:
+		"""Clock that bar closes are told by"""
+		return now()
+
 	def abort(self):
 		self.is_aborted = True
 		self.cleanup()
 
 	def run(self):
 		logger.info(f'Started running {type(self).__name__}.')
-		while not self.is_aborted:
-			self.handler()
+		if len(self.subscriptions):
+			BarCloseRunner().run([ self ])
+		else:
+			while not self.is_aborted:
+				self.handler()
 		logger.info(f'Stopped running {type(self).__name__}.')
\ No newline at end of file
@@ -0,0 +1,44 @@
+import pandas
+from core.trading.broker.simulation.scheduler import Scheduler
+from core.utils.test import test
+
+@test.group('Scheduler')
+def _():
+	scheduler: Scheduler = None
+	timestamp = pandas.Timestamp('2022-11-05', tz = 'UTC')
+
+	@test.before_each()
+	def _():
+		nonlocal scheduler
+		scheduler = Scheduler()
+
+	@test.case('should only run actions that are due in chronological order')
+	def _():
+		calls = []
+		for offset in [ 3, 1, 2, 1 ]:
+			scheduler.add(
+				action = calls.append,
+				timestamp = timestamp + pandas.Timedelta(minutes = offset),
+				args = [ offset ]
+			)
+		assert scheduler.next_due_timestamp == timestamp + pandas.Timedelta(minutes = 1)
+		assert not scheduler.is_due(timestamp)
+
+		scheduler.run_as_of(timestamp + pandas.Timedelta(minutes = 2))
+		assert calls == [ 1, 1, 2 ]
+		assert len(scheduler) == 1
+		assert scheduler.next_due_timestamp == timestamp + pandas.Timedelta(minutes = 3)
+
+	@test.case('should defer actions scheduled while running to the next run')
+	def _():
+		calls = []
+		def action():
+			calls.append('action')
+			scheduler.add(action = calls.append, timestamp = timestamp, args = [ 'scheduled' ])
+
+		scheduler.add(action = action, timestamp = timestamp)
+		scheduler.run_as_of(timestamp)
+		assert calls == [ 'action' ]
+		scheduler.run_as_of(timestamp)
+		assert calls == [ 'action', 'scheduled' ]
+		assert scheduler.next_due_timestamp == None
@@ -1,8 +1,13 @@
 import numpy
+import pandas
 from dataclasses import dataclass
 
 from core.trading.order import Order
 from core.trading.broker import SimulationBroker, Broker
+from core.trading.broker.simulation.prices import PricePaths
+from core.trading.broker.simulation.sweep import BacktestSweep
+from core.trading.broker.simulation.report import BacktestReport, EquityReport, PositionsReport, WalkForwardFoldReport, WalkForwardReport
+from core.trading.repository.simulation.prices import PricePath
 from core.trading.strategy import Strategy
 from core.trading.chart import CandleStickChart
 from core.trading.interval import Interval
@@ -19,56 +24,56 @@ def _():
 		nonlocal broker
 		broker = SimulationBroker()
 
-	@test.case('should backtest based on chart data')
-	def _():
-		@dataclass
-		class TestStrategy(Strategy):
-			broker: Broker = None
-			repository: Repository = None
+	@dataclass
+	class TestStrategy(Strategy):
+		broker: Broker = None
+		repository: Repository = None
 
-			def __post_init__(self):
-				super().__post_init__()
-				self.count = 0
+		def __post_init__(self):
+			super().__post_init__()
+			self.count = 0
 
-			def handler(self):
-				if self.count == 0:
-					Order(
-						type = 'buy',
-						symbol = 'EURUSD',
-						size = Size.Lot(20),
-						broker = self.broker
-					).place()
-
-				elif self.count == 5:
-					positions = self.broker.get_positions('EURUSD', status = 'open')
-					assert len(positions) == 1, 'Should have placed a market order in the next tick.'
-					positions[-1].close()
-					Order(
-						type = 'buy',
-						symbol = 'EURUSD',
-						size = Size.PercentageOfBalance(2),
-						limit = 10,
-						broker = self.broker
-					).place()
-
-				elif self.count == 10:
-					orders = self.broker.get_orders('EURUSD')
-					assert len(orders) == 2, 'Should show all orders'
-
-					open_orders = self.broker.get_orders('EURUSD', status = 'open')
-					assert len(open_orders) == 1, 'Should only show open orders'
-
-					filled_orders = self.broker.get_orders('EURUSD', status = 'filled')
-					assert len(filled_orders) == 1, 'Should only show filled orders'
-
-					Order(
-						type = 'buy',
-						symbol = 'EURUSD',
-						size = Size.Lot(1),
-						broker = self.broker
-					).place()
-
-				self.count += 1
+		def handler(self):
+			if self.count == 0:
+				Order(
+					type = 'buy',
+					symbol = 'EURUSD',
+					size = Size.Lot(20),
+					broker = self.broker
+				).place()
+
+			elif self.count == 5:
+				positions = self.broker.get_positions('EURUSD', status = 'open')
+				assert len(positions) == 1, 'Should have placed a market order in the next tick.'
+				positions[-1].close()
+				Order(
+					type = 'buy',
+					symbol = 'EURUSD',
+					size = Size.PercentageOfBalance(2),
+					limit = 10,
+					broker = self.broker
+				).place()
+
+			elif self.count == 10:
+				orders = self.broker.get_orders('EURUSD')
+				assert len(orders) == 2, 'Should show all orders'
+
+				open_orders = self.broker.get_orders('EURUSD', status = 'open')
+				assert len(open_orders) == 1, 'Should only show open orders'
+
+				filled_orders = self.broker.get_orders('EURUSD', status = 'filled')
+				assert len(filled_orders) == 1, 'Should only show filled orders'
+
+				Order(
+					type = 'buy',
+					symbol = 'EURUSD',
+					size = Size.Lot(1),
+					broker = self.broker
+				).place()
+
+			self.count += 1
+
+	def build_strategy():
 		strategy = TestStrategy(
 			broker = broker,
 			repository = broker.repository
@@ -79,7 +84,161 @@ def _():
 			from_timestamp = '2021-05-13 12:00',
 			to_timestamp = '2021-05-13 14:10'
 		)
-		broker.backtest(strategy)
+		return strategy
+
+	@test.case('should backtest based on chart data')
+	def _():
+		broker.backtest(build_strategy())
+		closed_positions = broker.get_positions(status = 'closed')
+		assert broker.balance == broker.initial_cash + sum(position.profit for position in closed_positions), 'Should keep track of realized profit'
+
+	@test.case('should backtest on preloaded price paths')
+	def _():
+		broker.backtest(
+			build_strategy(),
+			preload = True,
+			symbols = [ 'EURUSD' ],
+		)
+		assert broker.price_paths.close.shape == (1, len(broker.timesteps))
+		assert len(broker.get_orders('EURUSD')) == 3
+
+	@test.case('should only stop on events when backtesting event driven')
+	def _():
+		broker.backtest(
+			build_strategy(),
+			event_driven = True,
+			symbols = [ 'EURUSD' ],
+		)
+		assert len(broker.get_orders('EURUSD')) == 3
+		assert broker.equity_curve.notna().all(), 'Should fill the equity curve in between events'
+
+	@test.case('should map price paths shared by another process without copying')
+	def _():
+		timesteps = pandas.date_range('2022-11-07', periods = 4, freq = 'min', tz = 'UTC')
+		price_paths = PricePaths(timesteps = timesteps)
+		price_paths.rows = { 'EURUSD' : 0, 'USDCAD' : 1 }
+		for name in PricePath.fields:
+			setattr(price_paths, name, numpy.arange(8, dtype = 'float64').reshape(2, 4))
+
+		memory, shared = price_paths.to_shared_memory()
+		try:
+			worker_memory, worker_price_paths = PricePaths.from_shared_memory(shared)
+			assert list(worker_price_paths.get_prices([ 'USDCAD', 'EURUSD' ], 2)) == [ 6, 2 ]
+			assert not worker_price_paths.close.flags.writeable
+			worker_memory.close()
+		finally:
+			memory.close()
+			memory.unlink()
+
+	@test.case('should walk forward over rolling train and test folds')
+	def _():
+		broker.timesteps = CandleStickChart(
+			symbol = 'EURUSD',
+			interval = Interval.Minute(1),
+			from_timestamp = '2021-05-13 12:00',
+			to_timestamp = '2021-05-13 14:10'
+		)
+		report = broker.walk_forward(
+			lambda broker, fold: TestStrategy(broker = broker, repository = broker.repository),
+			train = Interval.Minute(30),
+			test = Interval.Minute(30),
+			symbols = [ 'EURUSD' ],
+			write_report = False,
+		)
+		assert len(report.folds) == 3
+		assert report.folds[0].test.from_timestamp == report.folds[0].train.to_timestamp
+		assert report.folds[1].train.from_timestamp == report.folds[0].test.from_timestamp
+
+	@test.case('should backtest every combination of a grid in worker processes')
+	def _():
+		@dataclass
+		class SweepStrategy(Strategy):
+			broker: Broker = None
+			lots: float = 1
+
+			def handler(self):
+				if len(self.broker.orders) == 0:
+					for symbol in [ 'EURUSD', 'USDCAD' ]: # USDCAD only gets loaded by the workers
+						Order(type = 'buy', symbol = symbol, size = Size.Lot(self.lots), broker = self.broker).place()
+
+		sweep = BacktestSweep(
+			strategy = SweepStrategy,
+			grid = { 'lots': [ 1, 2 ] },
+			symbols = [ 'EURUSD' ],
+			timesteps = CandleStickChart(
+				symbol = 'EURUSD',
+				interval = Interval.Minute(1),
+				from_timestamp = '2021-05-13 12:00',
+				to_timestamp = '2021-05-13 12:30'
+			),
+			event_driven = True,
+			workers = 2,
+			broker = broker,
+		)
+		documents = sweep.run()
+		assert len(documents) == len(sweep.combinations) == 2
+
+	@test.case('should refuse to walk forward when no fold fits')
+	def _():
+		broker.timesteps = pandas.date_range('2021-05-13 12:00', periods = 40, freq = 'min', tz = 'UTC')
+		try:
+			broker.walk_forward(
+				lambda broker, fold: TestStrategy(broker = broker),
+				train = Interval.Minute(30),
+				test = Interval.Minute(30),
+				write_report = False,
+			)
+		except Exception as exception:
+			assert 'No fold' in str(exception)
+		else:
+			assert False, 'Should have raised'
+
+	@test.case('should report folds without any trades')
+	def _():
+		positions = PositionsReport.from_positions([])
+		assert positions.win_rate == None and positions.profit.average == None
+
+		equity = EquityReport.from_curve(pandas.Series([ 1000., 1000. ], index = pandas.date_range('2021-05-13', periods = 2, freq = 'min', tz = 'UTC')))
+		fold = WalkForwardFoldReport(backtest = BacktestReport(equity = equity, positions = positions))
+		report = WalkForwardReport.from_folds([ fold, fold ])
+		assert report.return_percentage.average == 0
+		assert report.win_rate.average == None
+
+	@test.case('should serialize the equity curve into compact binary columns')
+	def _():
+		timesteps = pandas.date_range('2022-11-07', periods = 10000, freq = 'min', tz = 'UTC')
+		equity_curve = pandas.Series(numpy.linspace(1000, 1100, len(timesteps)), index = timesteps, name = 'equity')
+
+		document = broker.dataclass_serializer.to_mongo_document(equity_curve)
+		assert len(document['index']) < 1000, 'Should compress regular timesteps'
+		assert broker.dataclass_serializer.series_serializer.to_series(document).equals(equity_curve)
+
+	@test.case('should keep the equity curve when serializing a whole backtest report')
+	def _():
+		timesteps = pandas.date_range('2022-11-07', periods = 100, freq = 'min', tz = 'UTC')
+		equity_curve = pandas.Series(numpy.linspace(1000, 1100, len(timesteps)), index = timesteps, name = 'equity')
+		report = BacktestReport(
+			equity = EquityReport.from_curve(equity_curve),
+			positions = PositionsReport.from_positions([]),
+		)
+
+		document = broker.dataclass_serializer.to_mongo_document(report)
+		assert document['equity']['curve']['length'] == len(equity_curve)
+		restored = broker.dataclass_serializer.from_mongo_document(document)
+		assert restored['equity']['curve'].equals(equity_curve)
+		assert restored['equity']['close'] == report.equity.close
+
+	@test.case('should look up orders by status, symbol and type')
+	def _():
+		broker.now = '2022-11-05'
+		for symbol, type in [ ('EURUSD', 'buy'), ('USDCAD', 'sell'), ('EURUSD', 'sell') ]:
+			broker.place_order(Order(type = type, symbol = symbol, broker = broker), schedule = False)
+		broker.cancel_order(broker.orders[0], schedule = False)
+
+		assert broker.get_orders(status = 'open') == broker.orders[1:]
+		assert broker.get_orders('EURUSD', status = [ 'open', 'cancelled' ]) == [ broker.orders[0], broker.orders[2] ]
+		assert broker.get_orders(type = 'sell', status = 'cancelled') == []
+		assert broker.get_orders('EURUSD', to_timestamp = '2022-11-04') == []
 
 	@test.case('should return the last price as of the current time of the repository')
 	def _():
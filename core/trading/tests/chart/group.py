@@ -1,5 +1,9 @@
+import numpy
+import pandas
 from core.trading.interval import Interval
 from core.trading.chart import ChartGroup, CandleStickChart, LineChart
+from core.trading.chart.group import assemble_dataframe, assemble_dataframes
+from core.trading.chart.materialized import MaterializedChartGroup
 from core.trading.repository import SimulationRepository
 
 from core.utils.test import test
@@ -41,4 +45,66 @@ def _():
 		chart = chart_group.charts[1]
 		assert len(chart_group.dataframe.index) == len(chart.dataframe.index)
 		assert len(chart_group.dataframe) != 0
-		assert len(chart.data) != 0
\ No newline at end of file
+		assert len(chart.data) != 0
+
+	@test.case('should align the values of every chart on the union of their timestamps')
+	def _():
+		timestamps = pandas.date_range('2021-10-01', periods = 4, freq = 'min', tz = 'UTC')
+		dataframe = assemble_dataframe(
+			timestamps = [ timestamps[[ 0, 2, 3 ]].asi8, timestamps[[ 1, 2 ]].asi8 ],
+			values = [ numpy.array([ [ 1., 10. ], [ 2., 20. ], [ 3., 30. ] ]), numpy.array([ [ 5. ], [ 6. ] ]) ],
+			columns = pandas.MultiIndex.from_tuples([ ('b', 'close'), ('b', 'open'), ('a', 'close') ]),
+		)
+		assert list(dataframe.index) == list(timestamps)
+		assert list(dataframe.columns) == [ ('a', 'close'), ('b', 'close'), ('b', 'open') ]
+		assert dataframe.fillna(0).values.tolist() == [ [ 0, 1, 10 ], [ 5, 0, 0 ], [ 6, 2, 20 ], [ 0, 3, 30 ] ]
+
+	@test.case('should join the dataframes of charts the same as concatenating them')
+	def _():
+		timestamps = pandas.date_range('2021-10-01', periods = 6, freq = 'min', tz = 'UTC')
+		dataframes = [
+			pandas.DataFrame(
+				{ ('b', 'close'): [ 1., 2., 3. ], ('b', 'volume'): [ 10, 20, 30 ] },
+				index = pandas.DatetimeIndex(timestamps[[ 0, 2, 5 ]], name = 'timestamp'),
+			),
+			pandas.DataFrame(
+				{ ('a', 'close'): [ 4., 5., 6. ] },
+				index = pandas.DatetimeIndex(timestamps[[ 1, 2, 4 ]], name = 'timestamp'),
+			),
+		]
+		expected = pandas.concat(dataframes, axis = 1)
+		expected = expected.reindex(expected.columns.sort_values(), axis = 1).astype('float64')
+		assert assemble_dataframes(dataframes).equals(expected)
+
+@test.group('MaterializedChartGroup')
+def _():
+	timestamps = pandas.date_range('2021-10-01', periods = 10, freq = 'min', tz = 'UTC')
+	chart_group = ChartGroup(
+		charts = [
+			CandleStickChart(symbol = 'EURUSD', interval = Interval.Minute(1)),
+		]
+	)
+	chart_group.dataframe = pandas.DataFrame(
+		numpy.arange(10.).reshape(10, 1),
+		index = timestamps,
+		columns = pandas.MultiIndex.from_tuples([ (chart_group.charts[0].name, 'close') ])
+	)
+	materialized = MaterializedChartGroup(chart_group)
+
+	@test.case('should leave out the bar as of the timestamp from the window before it')
+	def _():
+		start, stop = materialized.get_bounds_before(timestamps[5] + pandas.Timedelta(seconds = 30), 3)
+		assert list(materialized.to_dataframe(start, stop).iloc[:, 0]) == [ 2, 3, 4 ]
+		assert materialized.get_windows([ stop ], 3)[0, :, 0].tolist() == [ 2, 3, 4 ]
+
+	@test.case('should leave out the bar as of the timestamp from the window after it')
+	def _():
+		start, stop = materialized.get_bounds_after(timestamps[5], 3)
+		assert list(materialized.to_dataframe(start, stop).iloc[:, 0]) == [ 6, 7, 8 ]
+
+	@test.case('should find the window bounds of many timestamps at once')
+	def _():
+		stops = materialized.get_stops_before(timestamps[[ 4, 8 ]])
+		starts = materialized.get_starts_after(timestamps[[ 1, 5 ]])
+		assert materialized.get_windows(stops, 3)[:, :, 0].tolist() == [ [ 1, 2, 3 ], [ 5, 6, 7 ] ]
+		assert materialized.get_windows(starts + 3, 3)[:, :, 0].tolist() == [ [ 2, 3, 4 ], [ 6, 7, 8 ] ]
@@ -0,0 +1,28 @@
+import numpy
+import pandas
+from core.trading.chart.live import ChartBuffer
+
+from core.utils.test import test
+
+@test.group('ChartBuffer')
+def _():
+	timestamps = pandas.date_range('2021-10-01', periods = 10, freq = 'min', tz = 'UTC')
+	dataframe = pandas.DataFrame({ 'close' : numpy.arange(10.) }, index = timestamps)
+
+	@test.case('should keep only the last bars in order')
+	def _():
+		buffer = ChartBuffer(capacity = 4)
+		buffer.extend(dataframe.iloc[:3])
+		buffer.extend(dataframe.iloc[3:7])
+		assert buffer.to_dataframe()['close'].tolist() == [ 3, 4, 5, 6 ]
+		assert buffer.last_timestamp == timestamps[6]
+
+	@test.case('should replace the bars that get read again')
+	def _():
+		buffer = ChartBuffer(capacity = 4)
+		buffer.extend(dataframe.iloc[:5])
+		updated = dataframe.iloc[4:6].copy()
+		updated['close'] = [ 40., 50. ]
+		buffer.extend(updated)
+		assert buffer.to_dataframe()['close'].tolist() == [ 2, 3, 40, 50 ]
+		assert list(buffer.to_dataframe().index) == list(timestamps[2:6])
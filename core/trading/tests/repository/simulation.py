@@ -1,7 +1,16 @@
+import numpy
+import pandas
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import fields
-from core.trading.chart import CandleStickChart, LineChart, Chart
+from core.trading.chart import CandleStickChart, LineChart, Chart, ChartGroup
+from core.trading.chart.group import assemble_dataframes
+from core.trading.repository.financialmodelingprep.charts.insider_transaction import InsiderTransactionChart
 from core.trading.repository import SimulationRepository, AlphaVantageRepository
+from core.trading.repository.simulation.prices import PricePath
+from core.trading.repository.simulation.store import ChartStore
 from core.trading.interval import Interval
+from core.utils.time import normalize_timestamp
 
 from core.utils.test import test
 
@@ -48,6 +57,49 @@ def _():
 			).read()
 			assert len(chart) == chart.count
 
+		@test.case('should serve the last price from the price cache')
+		def _():
+			simulation_repository.now = '2021-10-05 12:00'
+			price = simulation_repository.get_last_price('EURUSD')
+			assert 'EURUSD' in simulation_repository.price_cache
+
+			uncached_repository = SimulationRepository(price_cache = None)
+			uncached_repository.now = simulation_repository.now
+			assert price == uncached_repository.get_last_price('EURUSD')
+
+		@test.case('should read a chart group at once the same as chart by chart')
+		def _():
+			chart_group = ChartGroup(
+				charts = [
+					CandleStickChart(symbol = 'EURUSD', interval = Interval.Minute(1)),
+					CandleStickChart(symbol = 'USDCAD', interval = Interval.Minute(1)),
+				],
+				common_params = {
+					'repository': simulation_repository,
+					'from_timestamp': normalize_timestamp('2021-10-04'),
+					'to_timestamp': normalize_timestamp('2021-10-05'),
+				}
+			)
+			dataframe = simulation_repository.read_chart_group(chart_group)
+
+			dataframes = []
+			for chart in chart_group.charts:
+				dataframes.append(chart.read().dataframe)
+				chart.dataframe = None
+			assert dataframe.equals(assemble_dataframes(dataframes))
+
+		@test.case('should only read chart groups with numeric fields at once')
+		def _():
+			chart_group = ChartGroup(charts = [ CandleStickChart(symbol = 'EURUSD', interval = Interval.Minute(1)) ])
+			assert simulation_repository.can_read_chart_group(chart_group)
+			assert not simulation_repository.can_read_chart_group(chart_group, collection = 'EURUSD')
+
+			chart_group.add_chart(InsiderTransactionChart(symbol = 'AAPL'))
+			assert not simulation_repository.can_read_chart_group(chart_group)
+
+			chart_group = ChartGroup(charts = [ InsiderTransactionChart(symbol = 'AAPL') ])
+			assert simulation_repository.can_read_chart_group(chart_group, select = [ 'insider_securities_owned' ])
+
 		@test.case("should upsert chart data to it's historical data")
 		def _():
 			chart = LineChart(
@@ -64,3 +116,67 @@ def _():
 
 			assert simulation_repository.get_min_available_timestamp(chart).date() == chart.data.index[0].date()
 			assert simulation_repository.get_max_available_timestamp(chart).date() == chart.data.index[-1].date()
+
+@test.group('PricePath')
+def _():
+	timestamps = pandas.date_range('2021-10-01', periods = 10, freq = 'min', tz = 'UTC')
+	path = PricePath.from_dataframe(
+		pandas.DataFrame(
+			{
+				'high': numpy.arange(10) + 1.,
+				'low': numpy.arange(10) - 1.,
+				'close': numpy.arange(10) * 1.,
+			},
+			index = timestamps
+		)
+	)
+
+	@test.case('should find the last price as of a timestamp')
+	def _():
+		assert path.get_last_price(timestamps[3] + pandas.Timedelta(seconds = 30)) == 3
+		assert path.get_last_price(timestamps[0] - pandas.Timedelta(seconds = 30)) == None
+
+	@test.case('should keep the high/low reached between aligned timestamps')
+	def _():
+		aligned = path.align(timestamps[::3])
+		assert list(aligned.close) == [ 0, 3, 6, 9 ]
+		assert list(aligned.high) == [ 1, 4, 7, 10 ]
+		assert list(aligned.low) == [ -1, 0, 3, 6 ]
+
+@test.group('ChartStore')
+def _():
+	timestamps = pandas.date_range('2021-10-01', periods = 30, freq = 'min', tz = 'UTC')
+	dataframe = pandas.DataFrame({ 'close': numpy.arange(30) * 1. }, index = timestamps)
+	store: ChartStore = None
+
+	@test.before_each()
+	def _():
+		nonlocal store
+		store = ChartStore(directory = tempfile.mkdtemp())
+
+	@test.case('should only report the ranges that have not been stored')
+	def _():
+		store.write('EURUSD', dataframe[10:21], timestamps[10], timestamps[20])
+		assert store.get_missing_ranges('EURUSD', timestamps[12], timestamps[15]) == []
+		assert store.get_missing_ranges('EURUSD', timestamps[0], timestamps[29]) == [
+			(timestamps[0], timestamps[10]),
+			(timestamps[20], timestamps[29]),
+		]
+
+	@test.case('should read back stored ranges')
+	def _():
+		store.write('EURUSD', dataframe[:16], timestamps[0], timestamps[15])
+		store.write('EURUSD', dataframe[15:], timestamps[15], timestamps[29])
+		assert store.get_coverage('EURUSD') == [ [ timestamps[0].value, timestamps[29].value ] ]
+		assert list(store.read('EURUSD', timestamps[5], timestamps[25])['close']) == list(range(5, 26))
+		assert store.read('EURUSD', timestamps[0], timestamps[29] + pandas.Timedelta(minutes = 1)) is None
+
+	@test.case('should keep the bars of every writer when they write at the same time')
+	def _():
+		def write(start: int):
+			store.write('EURUSD', dataframe[start:start + 5], timestamps[start], timestamps[start + 4])
+
+		with ThreadPoolExecutor(6) as executor:
+			list(executor.map(write, range(0, 30, 5)))
+		assert len(store.get_missing_ranges('EURUSD', timestamps[0], timestamps[29])) == 5 # the minutes between the ranges
+		assert list(store.read_all('EURUSD')['close']) == list(range(30))
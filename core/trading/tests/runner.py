@@ -0,0 +1,35 @@
+import pandas
+from dataclasses import dataclass
+from core.trading.interval import Interval
+from core.trading.runner import BarCloseRunner
+from core.trading.strategy import Strategy
+from core.utils.test import test
+
+@dataclass
+class CountingStrategy(Strategy):
+	runs: int = 3
+
+	def __post_init__(self):
+		super().__post_init__()
+		self.timestamps = []
+
+	def handler(self):
+		self.timestamps.append(self.now())
+		if len(self.timestamps) == self.runs:
+			self.abort()
+
+@test.group('BarCloseRunner')
+def _():
+	@test.case('should find the close of the bar a timestamp falls in')
+	def _():
+		timestamp = pandas.Timestamp('2021-10-01 10:07:30', tz = 'UTC')
+		assert BarCloseRunner.get_next_close(Interval.Minute(15), timestamp) == pandas.Timestamp('2021-10-01 10:15', tz = 'UTC')
+		assert BarCloseRunner.get_next_close(Interval.Minute(15), pandas.Timestamp('2021-10-01 10:15', tz = 'UTC')) == pandas.Timestamp('2021-10-01 10:30', tz = 'UTC')
+
+	@test.case('should run the strategy once per bar close until it is aborted')
+	def _():
+		strategy = CountingStrategy(decision_interval = Interval.Millisecond(50))
+		BarCloseRunner(delay = pandas.Timedelta(0)).run([ strategy ])
+		bars = [ timestamp.value // Interval.Millisecond(50).to_pandas_timedelta().value for timestamp in strategy.timestamps ]
+		assert len(bars) == 3
+		assert len(set(bars)) == 3
@@ -1,4 +1,5 @@
 import pandas
+import hashlib
 import inspect
 import termcolor
 from dataclasses import is_dataclass, fields as get_fields
@@ -96,4 +97,8 @@ def pretty_repr(
 		result += repr_closing(')')
 		return result
 
-	return repr(target)
\ No newline at end of file
+	return repr(target)
+
+def to_fingerprint(*values) -> str:
+	"""Short hash of the reprs of `values` that stays the same across runs as long as they do"""
+	return hashlib.sha1(repr(values).encode()).hexdigest()[:16]
@@ -1,7 +1,40 @@
+import numpy
 import pandas
 
 def mean_normalize(dataframe: pandas.DataFrame) -> pandas.DataFrame:
 	return (dataframe - dataframe.mean()) / (dataframe.std() + 10 ** -5)
 
 def min_max_normalize(dataframe: pandas.DataFrame) -> pandas.DataFrame:
-	return (dataframe - dataframe.min()) / ((dataframe.max() - dataframe.min()) + 10 ** -5)
\ No newline at end of file
+	return (dataframe - dataframe.min()) / ((dataframe.max() - dataframe.min()) + 10 ** -5)
+
+def forward_fill(values: numpy.ndarray, mask: numpy.ndarray, axis: int = -2) -> numpy.ndarray:
+	"""Replaces the masked values with the last unmasked one before them along `axis`. Leading masked values are kept."""
+	shape = [ 1 ] * values.ndim
+	shape[axis] = values.shape[axis]
+	positions = numpy.where(mask, 0, numpy.arange(values.shape[axis]).reshape(shape))
+	numpy.maximum.accumulate(positions, axis = axis, out = positions)
+	return numpy.take_along_axis(values, positions, axis = axis)
+
+def pct_change(values: numpy.ndarray, axis: int = -2) -> numpy.ndarray:
+	"""Same as `pandas.DataFrame.pct_change` along `axis`, missing values are forward filled first"""
+	values = numpy.moveaxis(forward_fill(values, numpy.isnan(values), axis = axis), axis, 0)
+	change = numpy.empty_like(values)
+	change[0] = numpy.nan
+	with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+		numpy.divide(values[1:], values[:-1], out = change[1:])
+	change[1:] -= 1
+	return numpy.moveaxis(change, 0, axis)
+
+def running_max(values: numpy.ndarray, axis: int = -2) -> tuple[numpy.ndarray, numpy.ndarray]:
+	"""Running maximum along `axis` and the position where it was first reached, i.e. the prefix `max` and `argmax` for every length"""
+	maximums = numpy.maximum.accumulate(values, axis = axis)
+	previous = numpy.moveaxis(numpy.empty_like(maximums), axis, 0)
+	previous[0] = -numpy.inf
+	previous[1:] = numpy.moveaxis(maximums, axis, 0)[:-1]
+	previous = numpy.moveaxis(previous, 0, axis)
+
+	shape = [ 1 ] * values.ndim
+	shape[axis] = values.shape[axis]
+	positions = numpy.where(values > previous, numpy.arange(values.shape[axis]).reshape(shape), 0)
+	numpy.maximum.accumulate(positions, axis = axis, out = positions)
+	return maximums, positions
@@ -0,0 +1,60 @@
+import numpy
+import pandas
+from core.utils.math import forward_fill, pct_change, running_max
+
+from core.utils.test import test
+
+@test.group('math')
+def _():
+	nan = numpy.nan
+	values = numpy.array([
+		[ nan, 1., nan, 4. ],
+		[ nan, nan, nan, nan ],
+		[ 2., 3., nan, 1. ],
+		[ nan, 3., nan, nan ],
+		[ 5., nan, nan, 2. ],
+	])
+
+	def equals(values: numpy.ndarray, expected: numpy.ndarray) -> bool:
+		return numpy.allclose(values, expected, equal_nan = True)
+
+	@test.case('should forward fill like pandas keeping leading and fully missing values missing')
+	def _():
+		filled = forward_fill(values, numpy.isnan(values))
+		assert equals(filled, pandas.DataFrame(values).ffill().to_numpy())
+		assert numpy.isnan(filled[:2, 0]).all() and numpy.isnan(filled[:, 2]).all()
+
+	@test.case('should forward fill along any axis of a batch')
+	def _():
+		batch = numpy.stack([ values, values[::-1] ])
+		filled = forward_fill(batch, numpy.isnan(batch), axis = 1)
+		assert equals(filled[1], pandas.DataFrame(values[::-1]).ffill().to_numpy())
+		assert equals(forward_fill(values.T, numpy.isnan(values.T), axis = -1), filled[0].T)
+
+	@test.case('should compute percentage changes like pandas')
+	def _():
+		changes = pct_change(values)
+		assert equals(changes, pandas.DataFrame(values).pct_change().to_numpy())
+		assert numpy.isnan(changes[:, 2]).all()
+
+	@test.case('should find the running maximum and where it was first reached')
+	def _():
+		values = numpy.array([
+			[ 1., 3., 2. ],
+			[ 3., 3., 2. ],
+			[ 2., 1., 2. ],
+			[ 3., 4., 2. ],
+		])
+		maximums, positions = running_max(values)
+		assert equals(maximums, pandas.DataFrame(values).cummax().to_numpy())
+		expected = [
+			[ pandas.Series(values[:length, column]).idxmax() for column in range(values.shape[1]) ]
+			for length in range(1, len(values) + 1)
+		]
+		assert positions.tolist() == expected, 'Ties should keep the first position like argmax'
+
+	@test.case('should keep the running maximum of a fully missing column missing')
+	def _():
+		maximums, positions = running_max(numpy.array([ [ nan, 1. ], [ nan, 2. ] ]))
+		assert numpy.isnan(maximums[:, 0]).all()
+		assert positions[:, 0].tolist() == [ 0, 0 ] and positions[:, 1].tolist() == [ 0, 1 ]
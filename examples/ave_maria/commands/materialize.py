@@ -0,0 +1,30 @@
+from dataclasses import dataclass, field
+from examples.ave_maria.container import AveMariaContainer
+from examples.ave_maria.config import AveMariaConfig
+
+from core.utils.command import CommandSession
+from core.utils.container.command import ContainerCommandSessionMixin
+
+@dataclass
+class MaterializeDatasetCommandSession(
+	ContainerCommandSessionMixin,
+	CommandSession
+):
+	config: AveMariaConfig = field(default_factory = AveMariaConfig)
+	container: AveMariaContainer = None
+
+	def setup(self):
+		super().setup()
+		self.parser.add_argument('--shard-size', type = int, default = 4096)
+
+	def run(self):
+		super().run()
+
+		dataset_service = self.container.tensorflow().dataset_service()
+		store = dataset_service.store
+		if store == None:
+			raise Exception("Specify the dataset's 'store_directory' to materialize the dataset into.")
+
+		store.shard_size = self.args.shard_size
+		dataset_service.sequence.load()
+		store.write(dataset_service.sequence)
\ No newline at end of file
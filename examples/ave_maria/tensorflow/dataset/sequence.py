@@ -1,29 +1,47 @@
 import functools
+import numpy
 import pandas
 import itertools
 
 from dataclasses import dataclass, field
 from keras.utils.data_utils import Sequence
 
+from core.trading.chart.materialized import MaterializedChartGroup
+from core.trading.interval import Interval
 from core.trading.repository import SimulationRepository
 from core.utils.logging import Logger
+from core.utils.cls.repr import to_fingerprint
+from core.utils.math import forward_fill
 
 from examples.ave_maria.tensorflow.preprocessor.service import AveMariaPreprocessorService
 from examples.ave_maria.trading.config import AveMariaTradingConfig
 from core.tensorflow.dataset.sequence import sequence_dataclass_kwargs
+from core.tensorflow.dataset.sequence.batched import stack
 
 logger = Logger(__name__)
 
+def get_first_timestamp(chart_group, default: pandas.Timestamp) -> pandas.Timestamp:
+	"""First timestamp of a read chart group, `default` if it read nothing"""
+	return chart_group.dataframe.index[0] if len(chart_group.dataframe) else default
+
+def get_last_timestamp(chart_group, default: pandas.Timestamp) -> pandas.Timestamp:
+	"""Last timestamp of a read chart group, `default` if it read nothing"""
+	return chart_group.dataframe.index[-1] if len(chart_group.dataframe) else default
+
 @dataclass(**sequence_dataclass_kwargs)
 class AveMariaSequence(Sequence):
 	trading_config: AveMariaTradingConfig = None
 	preprocessor_service: AveMariaPreprocessorService = None
 	repository: SimulationRepository = field(default_factory = SimulationRepository)
+	materialize: bool = False
 
 	def __len__(self):
 		return len(self.timestamps)
 
 	def __getitem__(self, index):
+		if self.materialize:
+			return self.get_materialized_item(index)
+
 		input_chart_groups = self.trading_config.observation.build_chart_group()
 		output_chart_group = self.trading_config.action.build_chart_group()
 		timestamp = self.timestamps[index]
@@ -53,6 +71,115 @@ class AveMariaSequence(Sequence):
 
 		return x, y
 
+	@property
+	def fingerprint(self) -> str:
+		"""Changes whenever the samples would, i.e. with the charts, bars or trading conditions they're built from"""
+		observation = self.trading_config.observation
+		action = self.trading_config.action
+		return to_fingerprint(
+			observation.symbols,
+			observation.intervals,
+			observation.bars,
+			action.symbols,
+			action.interval,
+			action.bars,
+			action.window_lengths,
+			action.conditions,
+		)
+
+	def load(self):
+		"""Materializes the history upfront, e.g. before the sequence gets copied into worker processes"""
+		if self.materialize:
+			self.materialized_input_chart_groups
+			self.materialized_output_chart_group
+
+	def get_materialized_item(self, index):
+		timestamp = self.timestamps[index]
+		input_chart_groups = self.trading_config.observation.build_chart_group()
+		for interval, chart_group in input_chart_groups.items():
+			materialized = self.materialized_input_chart_groups[interval]
+			start, stop = materialized.get_bounds_before(timestamp, self.trading_config.observation.bars)
+			if stop - start < self.trading_config.observation.bars:
+				return # not enough history before the timestamp
+			materialized.to_chart_group(chart_group, start, stop)
+
+		output_chart_group = self.trading_config.action.build_chart_group()
+		start, stop = self.materialized_output_chart_group.get_bounds_after(timestamp, self.trading_config.action.bars)
+		if stop - start < self.trading_config.action.bars:
+			return # not enough bars after the timestamp
+		self.materialized_output_chart_group.to_chart_group(output_chart_group, start, stop)
+
+		x = self.preprocessor_service.to_model_input(input_chart_groups)
+		if type(x) == type(None):
+			return
+
+		y = self.preprocessor_service.to_model_output(output_chart_group)
+		if type(y) == type(None):
+			return
+
+		return x, y
+
+	def get_batch(self, indices: numpy.ndarray):
+		"""Builds a whole batch out of windows of the materialized history at once. The samples at `indices` are expected to be valid, i.e. filtered by a `SkippableSequence`."""
+		if not self.materialize:
+			return stack([ self[index] for index in indices ])
+
+		timestamps = self.timestamps[numpy.asarray(indices)]
+		x = {}
+		for interval, materialized in self.materialized_input_chart_groups.items():
+			windows = materialized.get_windows(materialized.get_stops_before(timestamps), self.trading_config.observation.bars)
+			x[str(interval)] = self.preprocessor_service.to_model_input_array(
+				windows,
+				self.preprocessor_service.get_input_column_masks(materialized.chart_group)
+			)
+
+		materialized = self.materialized_output_chart_group
+		bars = self.trading_config.action.bars
+		windows = materialized.get_windows(materialized.get_starts_after(timestamps) + bars, bars)
+		y = self.preprocessor_service.to_model_output_array(
+			forward_fill(windows, numpy.isnan(windows)),
+			self.preprocessor_service.get_output_column_positions(materialized.chart_group)
+		)
+		return x, y
+
+	@property
+	@functools.cache
+	def materialized_input_chart_groups(self) -> dict[Interval, MaterializedChartGroup]:
+		materialized = {}
+		for interval, chart_group in self.trading_config.observation.build_chart_group().items():
+			logger.info(f'Materializing {interval} input charts...')
+			# Counted in bars rather than time so weekends and holidays don't leave the first windows short
+			chart_group.read(
+				repository = self.repository,
+				to_timestamp = self.common_time_window.from_timestamp, # inclusive
+				count = self.trading_config.observation.bars + 1,
+			)
+			materialized[interval] = MaterializedChartGroup.read(
+				chart_group,
+				repository = self.repository,
+				from_timestamp = get_first_timestamp(chart_group, self.common_time_window.from_timestamp),
+				to_timestamp = self.common_time_window.to_timestamp,
+			)
+		return materialized
+
+	@property
+	@functools.cache
+	def materialized_output_chart_group(self) -> MaterializedChartGroup:
+		logger.info(f'Materializing {self.trading_config.action.interval} output charts...')
+		chart_group = self.trading_config.action.build_chart_group()
+		# Counted in bars rather than time so weekends and holidays don't leave the last windows short
+		chart_group.read(
+			repository = self.repository,
+			from_timestamp = self.common_time_window.to_timestamp, # inclusive
+			count = self.trading_config.action.bars + 1,
+		)
+		return MaterializedChartGroup.read(
+			chart_group,
+			repository = self.repository,
+			from_timestamp = self.common_time_window.from_timestamp,
+			to_timestamp = get_last_timestamp(chart_group, self.common_time_window.to_timestamp),
+		)
+
 	@property
 	@functools.cache
 	def timestamps(self):
@@ -61,12 +188,7 @@ class AveMariaSequence(Sequence):
 			self.common_time_window.to_timestamp,
 			freq='min'
 		)
-		timestamps = [
-			timestamp
-			for timestamp in timestamps
-			if self.trading_config.action.conditions.is_trading_hours(timestamp)
-		]
-		return timestamps
+		return timestamps[self.trading_config.action.conditions.get_trading_hours_mask(timestamps)]
 
 	@property
 	@functools.cache
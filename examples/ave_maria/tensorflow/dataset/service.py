@@ -1,3 +1,5 @@
+import tensorflow
+from pathlib import Path
 from dataclasses import dataclass
 from keras.utils.data_utils import Sequence
 
@@ -7,6 +9,9 @@ from core.tensorflow.dataset.sequence.batched import BatchedSequence
 from core.tensorflow.dataset.sequence.partial import PartialSequence
 from core.tensorflow.dataset.sequence.shuffled import ShuffledSequence
 from core.tensorflow.dataset.sequence.skippable import SkippableSequence
+from core.tensorflow.dataset.sequence.stored import StoredSequence
+from core.tensorflow.dataset.store import TensorStore
+from core.tensorflow.dataset.pipeline import build_pipeline
 
 from examples.ave_maria.trading.config import AveMariaTradingConfig
 from examples.ave_maria.tensorflow.preprocessor.service import AveMariaPreprocessorService
@@ -22,19 +27,55 @@ class AveMariaDatasetService(DatasetService):
 		self.sequence = AveMariaSequence(
 			trading_config = self.trading_config,
 			preprocessor_service = self.preprocessor_service,
+			materialize = self.config.materialize,
 		)
 
+	@property
+	def store(self) -> TensorStore:
+		if self.config.store_directory:
+			return TensorStore(
+				directory = self.config.store_directory,
+				fingerprint = self.sequence.fingerprint,
+			)
+
 	def build(self) -> tuple[Sequence, Sequence]:
 		# Dataset
-		dataset = self.sequence
-		dataset = ShuffledSequence(dataset)
-		dataset = SkippableSequence(dataset)
+		# Shuffled once so that the training/validation split stays the same across epochs
+		store = self.store
+		if store and store.exists:
+			# Stored samples are all valid so batches get gathered from the shards in one go
+			dataset = ShuffledSequence(StoredSequence(store = store), seed = self.config.seed)
+		else:
+			self.sequence.load()
+			dataset = SkippableSequence(
+				sequence = self.sequence,
+				path = self.config.validity_path,
+				workers = self.config.workers,
+				fingerprint = self.sequence.fingerprint,
+			)
+			dataset = ShuffledSequence(dataset, seed = self.config.seed)
 
-		# Training Dataset
 		training_dataset = PartialSequence(
 			sequence = dataset,
 			portion = 1 - self.config.validation_split
 		)
+		validation_dataset = PartialSequence(
+			sequence = dataset,
+			offset = 1 - self.config.validation_split,
+			portion = self.config.validation_split
+		)
+
+		if self.config.backend == 'tf.data':
+			return self.build_pipelines(training_dataset, validation_dataset)
+		return self.build_sequences(training_dataset, validation_dataset)
+
+	def build_sequences(self, training_dataset: Sequence, validation_dataset: Sequence) -> tuple[Sequence, Sequence]:
+		# Training Dataset
+		training_dataset = ShuffledSequence(
+			sequence = training_dataset,
+			seed = self.config.seed,
+			reshuffle = True
+		)
 		training_dataset = BatchedSequence(
 			sequence = training_dataset,
 			batch_size = self.config.batch_size
@@ -47,11 +88,6 @@ class AveMariaDatasetService(DatasetService):
 			)
 
 		# Validation Dataset
-		validation_dataset = PartialSequence(
-			sequence = dataset,
-			offset = 1 - self.config.validation_split,
-			portion = self.config.validation_split
-		)
 		validation_dataset = BatchedSequence(
 			sequence = validation_dataset,
 			batch_size = self.config.batch_size
@@ -63,3 +99,25 @@ class AveMariaDatasetService(DatasetService):
 				max_queue_size = self.config.max_queue_size
 			)
 		return training_dataset, validation_dataset
+
+	def build_pipelines(self, training_dataset: Sequence, validation_dataset: Sequence) -> tuple[tensorflow.data.Dataset, tensorflow.data.Dataset]:
+		training_cache_path, validation_cache_path = None, None
+		if self.config.cache_directory:
+			training_cache_path = Path(self.config.cache_directory).joinpath('training')
+			validation_cache_path = Path(self.config.cache_directory).joinpath('validation')
+
+		return (
+			build_pipeline(
+				training_dataset,
+				batch_size = self.config.batch_size,
+				shuffle = True,
+				seed = self.config.seed,
+				cache_path = training_cache_path,
+				shuffle_buffer_size = self.config.shuffle_buffer_size,
+			),
+			build_pipeline(
+				validation_dataset,
+				batch_size = self.config.batch_size,
+				cache_path = validation_cache_path,
+			),
+		)
@@ -1,16 +1,40 @@
 import numpy
 import pandas
+import functools
 from keras import Model
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+
+from core.trading.interval import Interval
+from core.trading.chart.materialized import MaterializedChartGroup
+from core.trading.chart.live import LiveChartGroup
+from core.utils.logging import Logger
 
 from examples.ave_maria.tensorflow.preprocessor.service import AveMariaPreprocessorService
+from examples.ave_maria.tensorflow.preprocessor.prediction import AveMariaPrediction
 from examples.ave_maria.trading.config import AveMariaTradingConfig
 from core.tensorflow.predictor.service import PredictorService
 
+logger = Logger(__name__)
+
+def find_first_crossings(
+	values: numpy.ndarray,
+	levels: numpy.ndarray,
+	starts: numpy.ndarray,
+	stops: numpy.ndarray,
+	compare: numpy.ufunc,
+) -> numpy.ndarray:
+	"""Position of the first value in every `[start, stop)` range that `compare`s true to its level, `-1` if there is none"""
+	offsets = numpy.arange(max((stops - starts).max(initial = 0), 1))
+	positions = starts[:, None] + offsets
+	with numpy.errstate(invalid = 'ignore'):
+		crossings = compare(values[numpy.minimum(positions, len(values) - 1)], levels[:, None]) & (positions < stops[:, None])
+	return numpy.where(crossings.any(axis = 1), starts + crossings.argmax(axis = 1), -1)
+
 @dataclass
 class AveMariaPredictorService(PredictorService):
 	trading_config: AveMariaTradingConfig = None
 	preprocessor_service: AveMariaPreprocessorService = None
+	live_model_input: dict[str, numpy.ndarray] = field(init = False, default = None, repr = False)
 
 	def predict(self, model: Model, timestamp: pandas.Timestamp):
 		input_chart_groups = self.trading_config.observation.build_chart_group()
@@ -35,16 +59,56 @@ class AveMariaPredictorService(PredictorService):
 				timestamp = timestamp,
 			)
 
+	def predict_live(self, model: Model, timestamp: pandas.Timestamp):
+		"""`predict` off the bars the live chart groups keep in memory. Only the bars since the last call get read
+		and the model input gets written into the same arrays every time."""
+		input_chart_groups = {
+			interval: live_chart_group.update(timestamp)
+			for interval, live_chart_group in self.live_chart_groups.items()
+		}
+		shapes = {
+			str(interval): (1, min(self.trading_config.observation.bars, len(chart_group.dataframe)), len(chart_group.dataframe.columns))
+			for interval, chart_group in input_chart_groups.items()
+		}
+		if self.live_model_input == None or any(self.live_model_input[key].shape != shape for key, shape in shapes.items()):
+			self.live_model_input = { key: numpy.empty(shape, dtype = 'float32') for key, shape in shapes.items() }
+
+		model_input = self.preprocessor_service.to_model_input(
+			input_chart_groups,
+			out = { key: value[0] for key, value in self.live_model_input.items() }
+		)
+		if model_input == None:
+			logger.warn(f'Unable to build the model input as of {timestamp}.')
+			return []
+
+		with self.device_service.selected_device:
+			model_output = model.predict_on_batch(self.live_model_input)
+			return self.preprocessor_service.to_prediction(
+				model_output,
+				timestamp = timestamp,
+			)
+
+	@functools.cached_property
+	def live_chart_groups(self) -> dict[Interval, LiveChartGroup]:
+		return {
+			interval: LiveChartGroup(
+				chart_group = chart_group,
+				bars = self.trading_config.observation.bars,
+			)
+			for interval, chart_group in self.trading_config.observation.build_chart_group().items()
+		}
+
 	def evaluate(
 		self,
 		model: Model,
 		timestamp: pandas.Timestamp
 	):
 		predictions = self.predict(model, timestamp)
+		interval = self.trading_config.action.interval.to_pandas_timedelta()
 		output_chart_group = self.trading_config.action.build_chart_group()
 		output_chart_group.read(
-			from_timestamp = timestamp + self.trading_config.action.interval.to_pandas_timedelta(),
-			to_timestamp = timestamp + self.trading_config.action.period.to_pandas_timedelta(),
+			from_timestamp = timestamp + interval,
+			to_timestamp = timestamp + interval * self.trading_config.action.bars,
 			count = None,
 		)
 
@@ -69,4 +133,121 @@ class AveMariaPredictorService(PredictorService):
 				sl_triggers = high[high <= prediction.sl]
 				prediction.sl_timestamp = sl_triggers.index[0] if len(sl_triggers) else None
 
-		return predictions
\ No newline at end of file
+		return predictions
+
+	def predict_many(
+		self,
+		model: Model,
+		timestamps: pandas.DatetimeIndex,
+		batch_size: int = 256,
+	) -> dict[pandas.Timestamp, list[AveMariaPrediction]]:
+		"""Predicts as of every timestamp with the history read once and the model called in batches of `batch_size`.
+		Timestamps that don't have enough data to build the model input for are left out."""
+		timestamps = pandas.DatetimeIndex(timestamps).sort_values()
+		materialized_inputs = self.read_input_history(timestamps)
+		is_valid = numpy.ones(len(timestamps), dtype = bool)
+		windows = {}
+		for interval, materialized in materialized_inputs.items():
+			windows[interval] = materialized.get_windows(materialized.get_stops_as_of(timestamps), self.trading_config.observation.bars)
+			is_valid &= ~numpy.isnan(windows[interval]).all(axis = -2).any(axis = -1)
+
+		if not is_valid.all():
+			logger.warn(f'Skipped {len(timestamps) - is_valid.sum()} timestamps with fully missing columns:\n{timestamps[~is_valid]}')
+		timestamps = timestamps[is_valid]
+		if len(timestamps) == 0:
+			return {}
+
+		model_input = {
+			str(interval): self.preprocessor_service.to_model_input_array(
+				windows[interval][is_valid],
+				self.preprocessor_service.get_input_column_masks(materialized.chart_group)
+			)
+			for interval, materialized in materialized_inputs.items()
+		}
+		with self.device_service.selected_device:
+			model_output = model.predict(model_input, batch_size = batch_size)
+
+		return {
+			timestamp: self.preprocessor_service.to_prediction(
+				model_output,
+				timestamp = timestamp,
+				sample = sample,
+				price_timestamp = timestamp,
+			)
+			for sample, timestamp in enumerate(timestamps)
+		}
+
+	def evaluate_many(
+		self,
+		model: Model,
+		timestamps: pandas.DatetimeIndex,
+		batch_size: int = 256,
+	) -> dict[pandas.Timestamp, list[AveMariaPrediction]]:
+		"""`evaluate` of every timestamp with the outcome charts read once and the TP/SL triggers found for all timestamps of a chart at once"""
+		predictions = self.predict_many(model, timestamps, batch_size = batch_size)
+		if len(predictions) == 0:
+			return predictions
+
+		timestamps = pandas.DatetimeIndex(list(predictions.keys()))
+		interval = self.trading_config.action.interval.to_pandas_timedelta()
+		period = interval * self.trading_config.action.bars
+		output_chart_group = self.trading_config.action.build_chart_group()
+		output_chart_group.read(
+			from_timestamp = timestamps[0] + interval,
+			to_timestamp = timestamps[-1] + period,
+			count = None,
+		)
+
+		index = output_chart_group.dataframe.index
+		starts = index.searchsorted(timestamps + interval, side = 'left')
+		stops = index.searchsorted(timestamps + period, side = 'right')
+		for position, chart in enumerate(output_chart_group.charts):
+			chart_predictions = [ predictions[timestamp][position] for timestamp in timestamps ]
+			high = chart.data['high'].to_numpy()
+			low = chart.data['low'].to_numpy()
+
+			# SHOULD DO: get the actual spread at a point in time not just pip size * 2
+			spread = self.trading_config.action.broker.repository.get_pip_size(chart.symbol) * 2
+
+			actions = numpy.array([ prediction.action for prediction in chart_predictions ], dtype = object)
+			tp = numpy.array([ numpy.nan if prediction.tp == None else prediction.tp for prediction in chart_predictions ], dtype = 'float64')
+			sl = numpy.array([ numpy.nan if prediction.sl == None else prediction.sl for prediction in chart_predictions ], dtype = 'float64')
+			is_buy = actions == 'buy'
+			is_sell = actions == 'sell'
+
+			tp_positions = numpy.where(
+				is_buy,
+				find_first_crossings(high, tp + spread, starts, stops, numpy.greater_equal),
+				find_first_crossings(low, tp - spread, starts, stops, numpy.greater_equal),
+			)
+			sl_positions = numpy.where(
+				is_buy,
+				find_first_crossings(low, sl, starts, stops, numpy.less_equal),
+				find_first_crossings(high, sl, starts, stops, numpy.less_equal),
+			)
+
+			for prediction, is_evaluated, tp_position, sl_position in zip(chart_predictions, is_buy | is_sell, tp_positions, sl_positions):
+				if not is_evaluated:
+					continue
+				prediction.tp_timestamp = index[tp_position] if tp_position >= 0 else None
+				prediction.sl_timestamp = index[sl_position] if sl_position >= 0 else None
+
+		return predictions
+
+	def read_input_history(self, timestamps: pandas.DatetimeIndex) -> dict[Interval, MaterializedChartGroup]:
+		"""Reads the input charts once from the earliest bar the first timestamp needs up to the last timestamp"""
+		materialized_inputs = {}
+		for interval, chart_group in self.trading_config.observation.build_chart_group().items():
+			# Start from where the first timestamp's bars start regardless of the gaps in the data
+			chart_group.read(
+				count = self.trading_config.observation.bars,
+				to_timestamp = timestamps[0],
+				refresh_indicators = False,
+			)
+			materialized_inputs[interval] = MaterializedChartGroup.read(
+				chart_group,
+				from_timestamp = chart_group.dataframe.index[0],
+				to_timestamp = timestamps[-1],
+				count = None,
+			)
+		return materialized_inputs
@@ -40,6 +40,7 @@ class AveMariaPrediction:
 
 	broker: Broker = field(default = None, repr = False)
 	timestamp: pandas.Timestamp = field(default_factory = now)
+	price_timestamp: pandas.Timestamp = field(default = None, repr = False) # latest prices if not specified
 
 	def __post_init__(self):
 		self.populate_prices()
@@ -77,10 +78,12 @@ class AveMariaPrediction:
 	def populate_prices(self):
 		self.sell_price = self.broker.repository.get_last_price(
 			symbol = self.symbol,
+			timestamp = self.price_timestamp,
 			intent = 'sell'
 		)
 		self.buy_price = self.broker.repository.get_last_price(
 			symbol = self.symbol,
+			timestamp = self.price_timestamp,
 			intent = 'buy'
 		)
 		self.spread = abs(self.buy_price - self.sell_price)
@@ -1,10 +1,12 @@
 import numpy
 import pandas
+import functools
 from dataclasses import dataclass
 
 from core.trading.chart import ChartGroup
 from core.trading.interval import Interval
 from core.utils.logging import Logger
+from core.utils.math import forward_fill, pct_change, running_max
 
 from examples.ave_maria.config import AveMariaTradingConfig
 from examples.ave_maria.tensorflow.preprocessor.prediction import AveMariaPrediction, AveMariaModelOutput
@@ -13,105 +15,154 @@ from core.tensorflow.preprocessor.service import PreprocessorService
 
 logger = Logger(__name__)
 
+@functools.lru_cache(maxsize = 32)
+def get_input_column_masks(columns: tuple[tuple[str, str]], chart_names: tuple[str]) -> dict[str, numpy.ndarray]:
+	charts = numpy.array([ name in chart_names for name, _ in columns ], dtype = bool)
+	fields = numpy.array([ field for _, field in columns ], dtype = object)
+	return {
+		'charts' : charts,
+		'spread_pips' : charts & (fields == 'spread_pips'),
+		'volume_tick' : charts & (fields == 'volume_tick'),
+	}
+
+@functools.lru_cache(maxsize = 32)
+def get_output_column_positions(columns: tuple[tuple[str, str]], chart_names: tuple[str]) -> dict[str, numpy.ndarray]:
+	return {
+		field : numpy.array([ columns.index((name, field)) for name in chart_names ])
+		for field in [ 'high', 'low' ]
+	}
+
 @dataclass
 class AveMariaPreprocessorService(PreprocessorService):
 	trading_config: AveMariaTradingConfig = None
 
-	def to_model_input(self, input_chart_groups: dict[Interval, ChartGroup]):
+	def to_model_input(
+		self,
+		input_chart_groups: dict[Interval, ChartGroup],
+		out: dict[str, numpy.ndarray] = None
+	):
+		"""Preprocesses the chart groups as whole `(bars, columns)` arrays. `out` can provide the arrays to write into, i.e. rows of a batch."""
+		inputs = {}
 		for interval, chart_group in input_chart_groups.items():
-			nan_columns = chart_group.dataframe.columns[chart_group.dataframe.isna().all().tolist()]
-			if len(nan_columns):
-				logger.debug(f'Full NaN columns at {chart_group.dataframe.index[0]}:\n{nan_columns}\n\n{chart_group.dataframe}')
+			values = chart_group.dataframe.to_numpy(dtype = 'float64')
+			nan_columns = numpy.isnan(values).all(axis = 0)
+			if nan_columns.any():
+				logger.debug(f'Full NaN columns at {chart_group.dataframe.index[0]}:\n{chart_group.dataframe.columns[nan_columns]}\n\n{chart_group.dataframe}')
 				return
 
-			for chart in chart_group.charts:
-				data = chart.data.copy()
-
-				# Forward fill missing spread data
-				if 'spread_pips' in data.columns:
-					data['spread_pips'] = data['spread_pips'].replace(to_replace = 0, method = 'ffill')
-					data['spread_pips'] = data['spread_pips'] + 2 # to prevent log returning 0 when spread is `1`
-					data['spread_pips'] = numpy.log(data['spread_pips'])
-
-				# Log normalize the volume
-				if 'volume_tick' in data.columns:
-					if not data['volume_tick'].isna().all():
-						data['volume_tick'] = data['volume_tick'] + 2 # to prevent log returning 0 when volume is `1`
-						data['volume_tick'] = numpy.log(data['volume_tick'])
-
-				# Convert to `change`
-				data = data.pct_change()
-
-				chart.data = data
-			chart_group.dataframe = chart_group.dataframe.fillna(0)
-			chart_group.dataframe = chart_group.dataframe.tail(self.trading_config.observation.bars)
-		inputs = {
-			str(interval): chart_group.dataframe.to_numpy()
-			for interval, chart_group in input_chart_groups.items()
-		}
+			inputs[str(interval)] = self.to_model_input_array(
+				values,
+				self.get_input_column_masks(chart_group),
+				out = None if out == None else out[str(interval)],
+			)
 		return inputs
 
-	def to_model_output(self, output_chart_group: ChartGroup):
-		outputs = {
-			'direction' : [],
-			'high_low' : []
-		}
+	def to_model_input_array(
+		self,
+		values: numpy.ndarray,
+		masks: dict[str, numpy.ndarray],
+		out: numpy.ndarray = None
+	) -> numpy.ndarray:
+		"""Preprocesses `(..., bars, columns)` values into the float32 `(..., observation bars, columns)` model input"""
+		values = numpy.array(values, dtype = 'float64')
+
+		# Forward fill missing spread data
+		spread = masks['spread_pips']
+		if spread.any():
+			spread_values = values[..., spread]
+			values[..., spread] = numpy.log(forward_fill(spread_values, spread_values == 0) + 2) # +2 to prevent log returning 0 when spread is `1`
+
+		# Log normalize the volume
+		volume = masks['volume_tick']
+		if volume.any():
+			values[..., volume] = numpy.log(values[..., volume] + 2) # +2 to prevent log returning 0 when volume is `1`
+
+		# Convert to `change`
+		charts = masks['charts']
+		values[..., charts] = pct_change(values[..., charts])
+
+		values = values[..., -self.trading_config.observation.bars:, :]
+		if type(out) == type(None):
+			out = numpy.empty(values.shape, dtype = 'float32')
+		numpy.copyto(out, values, casting = 'same_kind')
+		out[numpy.isnan(out)] = 0
+		return out
+
+	def get_input_column_masks(self, chart_group: ChartGroup) -> dict[str, numpy.ndarray]:
+		"""Which columns of the chart group belong to the charts themselves (as opposed to their indicators) and which of those need log normalizing"""
+		return get_input_column_masks(
+			tuple(chart_group.dataframe.columns),
+			tuple(chart.name for chart in chart_group.charts)
+		)
 
-		output_chart_group.dataframe = output_chart_group.dataframe.fillna(method = 'ffill')
+	def to_model_output(self, output_chart_group: ChartGroup):
+		values = output_chart_group.dataframe.to_numpy(dtype = 'float64')
+		values = forward_fill(values, numpy.isnan(values))
 
-		nan_columns = output_chart_group.dataframe.columns[output_chart_group.dataframe.isna().any().tolist()]
-		if len(nan_columns):
-			logger.debug(f'Full NaN columns at {output_chart_group.dataframe.index[0]}:\n{nan_columns}')
+		nan_columns = numpy.isnan(values).any(axis = 0)
+		if nan_columns.any():
+			logger.debug(f'Full NaN columns at {output_chart_group.dataframe.index[0]}:\n{output_chart_group.dataframe.columns[nan_columns]}')
 			return
 
-		output_chart_group.dataframe = output_chart_group.dataframe.head(self.trading_config.action.bars)
-		output_chart_group.dataframe = output_chart_group.dataframe.fillna(0)
-
-		output_chart_group.dataframe = output_chart_group.dataframe.reset_index(drop = True)
-		for chart in output_chart_group.charts:
-			high_low = []
-			direction = []
-			for window_length in self.trading_config.action.window_lengths:
-				min_low = chart.data['low'].iloc[0:window_length].min() / chart.data['low'].iloc[0] - 1
-				min_low_index = chart.data['low'].iloc[0:window_length].idxmin()
-				max_high = chart.data['high'].iloc[0:window_length].max() / chart.data['high'].iloc[0] - 1
-				max_high_index = chart.data['high'].iloc[0:window_length].idxmax()
-				high_low.append([
-					max_high,
-					min_low,
-				])
-				if min_low_index < max_high_index:
-					direction.append(min_low)
-				elif min_low_index > max_high_index:
-					direction.append(max_high)
-				else:
-					direction.append(0)
-
-			outputs['high_low'].append(high_low)
-			outputs['direction'].append(direction)
-		outputs = {
-			key: numpy.array(value)
-			for key, value in outputs.items()
+		return self.to_model_output_array(values, self.get_output_column_positions(output_chart_group))
+
+	def to_model_output_array(
+		self,
+		values: numpy.ndarray,
+		positions: dict[str, numpy.ndarray]
+	) -> dict[str, numpy.ndarray]:
+		"""Labels of `(..., bars, columns)` forward filled values. The extremes of every window are read off the running max/min
+		of the highs/lows at the window's last bar instead of slicing every window of every chart."""
+		values = values[..., :self.trading_config.action.bars, :]
+		high = values[..., positions['high']]
+		low = values[..., positions['low']]
+
+		window_ends = numpy.minimum(self.trading_config.action.window_lengths, values.shape[-2]) - 1
+		max_highs, max_high_indices = running_max(high)
+		min_lows, min_low_indices = running_max(-low)
+
+		# (..., charts, window lengths)
+		max_high = numpy.swapaxes(max_highs[..., window_ends, :] / high[..., :1, :] - 1, -1, -2)
+		min_low = numpy.swapaxes(-min_lows[..., window_ends, :] / low[..., :1, :] - 1, -1, -2)
+		max_high_index = numpy.swapaxes(max_high_indices[..., window_ends, :], -1, -2)
+		min_low_index = numpy.swapaxes(min_low_indices[..., window_ends, :], -1, -2)
+
+		return {
+			'direction' : numpy.select(
+				[ min_low_index < max_high_index, min_low_index > max_high_index ],
+				[ min_low, max_high ],
+				default = 0
+			),
+			'high_low' : numpy.stack([ max_high, min_low ], axis = -1),
 		}
-		return outputs
+
+	def get_output_column_positions(self, output_chart_group: ChartGroup) -> dict[str, numpy.ndarray]:
+		"""Positions of every chart's high and low columns in the chart group"""
+		return get_output_column_positions(
+			tuple(output_chart_group.dataframe.columns),
+			tuple(chart.name for chart in output_chart_group.charts)
+		)
 
 	def to_prediction(
 		self,
 		outputs: dict, # dict['direction' | 'high_low', (batch, chart, values)]
-		timestamp: pandas.Timestamp = None
+		timestamp: pandas.Timestamp = None,
+		sample: int = 0, # which one of the batch
+		price_timestamp: pandas.Timestamp = None, # the prices to base the prediction on, the latest ones if not specified
 	):
 		output_chart_group = self.trading_config.action.build_chart_group()
 		return [
 			AveMariaPrediction(
 				model_output = AveMariaModelOutput(
-					max_high_change = outputs['high_low'][0][index][0],
-					min_low_change = outputs['high_low'][0][index][1],
-					direction = numpy.greater(outputs['direction'][0][index], 0.5),
+					max_high_change = outputs['high_low'][sample][index][0],
+					min_low_change = outputs['high_low'][sample][index][1],
+					direction = numpy.greater(outputs['direction'][sample][index], 0.5),
 				),
 				symbol = chart.symbol,
 				broker = self.trading_config.action.broker,
 				trading_config = self.trading_config,
 				timestamp = timestamp,
+				price_timestamp = price_timestamp,
 			)
 			for index, chart in enumerate(output_chart_group.charts)
 		]
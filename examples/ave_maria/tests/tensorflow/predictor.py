@@ -0,0 +1,132 @@
+import numpy
+import pandas
+import contextlib
+from types import SimpleNamespace
+from dataclasses import dataclass
+
+from core.trading.broker import SimulationBroker
+from core.trading.chart import Symbol
+from core.trading.interval import Interval
+from core.trading.repository import Repository
+from core.utils.test import test
+
+from examples.ave_maria.trading.config import AveMariaTradingConfig
+from examples.ave_maria.trading.config.action import AveMariaActionConfig
+from examples.ave_maria.trading.config.observation import AveMariaObservationConfig
+from examples.ave_maria.tensorflow.predictor.service import AveMariaPredictorService, find_first_crossings
+from examples.ave_maria.tensorflow.preprocessor.service import AveMariaPreprocessorService
+
+@dataclass
+class InMemoryRepository(Repository):
+	"""Random walk candles of a few symbols with a few bars missing here and there"""
+	dataframes: dict[Symbol, pandas.DataFrame] = None
+	now: pandas.Timestamp = None
+
+	def __post_init__(self):
+		random = numpy.random.default_rng(0)
+		timestamps = pandas.date_range('2021-01-04', periods = 3000, freq = 'min', tz = 'UTC', name = 'timestamp')
+		timestamps = timestamps[random.random(len(timestamps)) > 0.05]
+		self.dataframes = {}
+		for symbol in [ 'EURUSD', 'USDCAD' ]:
+			close = 1 + numpy.cumsum(random.normal(0, 1e-4, len(timestamps)))
+			open = numpy.roll(close, 1)
+			self.dataframes[symbol] = pandas.DataFrame({
+				'open': open,
+				'high': numpy.maximum(open, close) + 2e-4,
+				'low': numpy.minimum(open, close) - 2e-4,
+				'close': close,
+			}, index = timestamps)
+
+	def read_chart(self, chart = None, **overrides) -> pandas.DataFrame:
+		from_timestamp = overrides.get('from_timestamp', chart.from_timestamp)
+		to_timestamp = overrides.get('to_timestamp', chart.to_timestamp)
+		count = overrides.get('count', chart.count)
+
+		dataframe = self.dataframes[chart.symbol]
+		if from_timestamp != None:
+			dataframe = dataframe[dataframe.index >= from_timestamp]
+		if to_timestamp != None:
+			dataframe = dataframe[dataframe.index <= to_timestamp]
+		if count:
+			dataframe = dataframe[-count:] if from_timestamp == None else dataframe[:count]
+		dataframe = dataframe[[ field for field in chart.select if field in dataframe.columns ]].copy()
+		dataframe.columns = pandas.MultiIndex.from_tuples([ (chart.name, field) for field in dataframe.columns ], names = [ 'chart', 'field' ])
+		return dataframe
+
+	def get_last_price(self, symbol: Symbol, timestamp: pandas.Timestamp = None, intent = None) -> float:
+		return self.dataframes[symbol]['close'].asof(timestamp or self.now)
+
+	def get_pip_size(self, symbol: Symbol):
+		return 1e-4
+
+class SummingModel:
+	"""Derives every output from the sum of the model input so each sample gets its own prediction"""
+	def predict(self, model_input: dict[str, numpy.ndarray], batch_size: int = None) -> dict[str, numpy.ndarray]:
+		sums = sum(values.sum(axis = (1, 2)) for values in model_input.values()) % 1
+		return {
+			'high_low': numpy.stack([ 0.0005 * (1 + sums), -0.0005 * (1 + sums) ], axis = -1)[:, None, :].repeat(2, axis = 1),
+			'direction': (sums[:, None] > 0.5).repeat(2, axis = 1).astype('float32'),
+		}
+
+@test.group('AveMariaPredictorService')
+def _():
+	repository = InMemoryRepository()
+	trading_config = AveMariaTradingConfig(
+		action = AveMariaActionConfig(
+			symbols = [ 'EURUSD', 'USDCAD' ],
+			interval = Interval.Minute(1),
+			bars = 20,
+			window_lengths = [ 5, 20 ],
+			broker = SimulationBroker(repository = repository),
+		),
+		observation = AveMariaObservationConfig(
+			symbols = [ 'EURUSD', 'USDCAD' ],
+			intervals = [ Interval.Minute(1) ],
+			bars = 30,
+			repository = repository,
+		),
+	)
+	predictor_service = AveMariaPredictorService(
+		trading_config = trading_config,
+		preprocessor_service = AveMariaPreprocessorService(trading_config = trading_config),
+		device_service = SimpleNamespace(selected_device = contextlib.nullcontext()),
+	)
+	model = SummingModel()
+	timestamps = pandas.date_range('2021-01-04 06:00', '2021-01-05 20:00', freq = '2h', tz = 'UTC')
+
+	def to_comparable(predictions) -> list[tuple]:
+		return [
+			(prediction.action, round(prediction.tp, 10), round(prediction.sl, 10), getattr(prediction, 'tp_timestamp', None), getattr(prediction, 'sl_timestamp', None))
+			for prediction in predictions
+		]
+
+	@test.case('should find the first value crossing its level in every range')
+	def _():
+		random = numpy.random.default_rng(0)
+		values = random.uniform(0, 1, 300)
+		values[random.random(300) < 0.1] = numpy.nan
+		starts = random.integers(0, 300, 50)
+		stops = numpy.minimum(starts + random.integers(0, 40, 50), 300)
+		levels = random.uniform(0.5, 1.1, 50)
+		levels[3] = numpy.nan
+
+		crossings = find_first_crossings(values, levels, starts, stops, numpy.greater_equal)
+		for start, stop, level, crossing in zip(starts, stops, levels, crossings):
+			positions = [ position for position in range(start, stop) if values[position] >= level ]
+			assert crossing == (positions[0] if len(positions) else -1)
+
+	@test.case('should predict many timestamps at once like one by one')
+	def _():
+		predictions = predictor_service.predict_many(model, timestamps, batch_size = 4)
+		assert list(predictions.keys()) == list(timestamps)
+		for timestamp in timestamps:
+			repository.now = timestamp
+			assert to_comparable(predictions[timestamp]) == to_comparable(predictor_service.predict(model, timestamp))
+
+	@test.case('should evaluate many timestamps at once like one by one')
+	def _():
+		predictions = predictor_service.evaluate_many(model, timestamps, batch_size = 4)
+		assert any(getattr(prediction, 'tp_timestamp', None) != None for timestamp_predictions in predictions.values() for prediction in timestamp_predictions)
+		for timestamp in timestamps:
+			repository.now = timestamp
+			assert to_comparable(predictions[timestamp]) == to_comparable(predictor_service.evaluate(model, timestamp))
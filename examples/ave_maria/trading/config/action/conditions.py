@@ -1,3 +1,4 @@
+import numpy
 import pandas
 from core.utils.config import Config, FloatRangeConfig, dataclass, field
 
@@ -53,4 +54,15 @@ class TradingConditions(Config):
 		if timestamp.day_of_week == 6 and timestamp.hour < 22:
 			return False
 
-		return True
\ No newline at end of file
+		return True
+
+	def get_trading_hours_mask(self, timestamps: pandas.DatetimeIndex) -> numpy.ndarray:
+		"""Vectorized `is_trading_hours` over a whole index"""
+		timestamps = timestamps.tz_convert('UTC') if timestamps.tz else timestamps.tz_localize('UTC')
+		month, day, day_of_week, hour = timestamps.month, timestamps.day, timestamps.day_of_week, timestamps.hour
+		is_closed = (month == 1) & (day == 1) \
+			| (month == 12) & (day == 25) \
+			| (day_of_week == 4) & (hour > 22) \
+			| (day_of_week == 5) \
+			| (day_of_week == 6) & (hour < 22)
+		return ~numpy.asarray(is_closed)
\ No newline at end of file
@@ -1,3 +1,5 @@
+import numpy
+import pandas
 from dataclasses import dataclass
 from core.trading.strategy import Strategy
 from core.trading.position import Position
@@ -29,10 +31,18 @@ class AveMariaStrategy(Strategy):
 	def __post_init__(self):
 		self.model = self.tuner_service.get_model(self.trainer_service.config.trial)
 		self.trainer_service.load_weights(self.model)
+		# Predictions only change once per bar of the action interval
+		self.decision_interval = self.decision_interval or self.config.action.interval
 		return super().__post_init__()
 
+	def now(self) -> pandas.Timestamp:
+		return self.config.action.broker.now
+
+	def get_decision_mask(self, timesteps: pandas.DatetimeIndex) -> numpy.ndarray:
+		return super().get_decision_mask(timesteps) & self.conditions.get_trading_hours_mask(timesteps)
+
 	def handler(self):
-		predictions = self.predictor_service.predict(self.model, self.config.action.broker.now)
+		predictions = self.predictor_service.predict_live(self.model, self.config.action.broker.now)
 		for prediction in predictions:
 			try:
 				self.block_invalid_sl_tp(prediction)